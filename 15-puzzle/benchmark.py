@@ -0,0 +1,176 @@
+#!/usr/local/bin/python3
+# benchmark.py : Reproducible benchmark and regression check for solve_luddy
+#
+# The corpus is generated from a seed: for every variant and target depth a
+# few boards are made by random walks back from the goal, and a board is kept
+# only when A* confirms its optimal route is exactly that depth. Every engine
+# is then run over the corpus, recording states expanded, wall time and peak
+# traced memory per (variant, depth, engine) group.
+#
+# --record writes the corpus and results as the baseline. Otherwise the
+# baseline's corpus is solved again and the run fails (exit status 1) when a
+# group expands more states, or takes longer, than the baseline by more than
+# the thresholds. Times are the best of --repeat runs and small groups get
+# --time-slack seconds of leeway, so timer noise does not fail the run.
+#
+# solve_luddy uses a variant's pattern database whenever one has been built,
+# which changes the states expanded by orders of magnitude. The databases used
+# are recorded with the baseline and a run that would use different ones is
+# refused; --no-pdb turns them off for both.
+#
+# Usage: ./benchmark.py [--record] [--baseline=benchmark_baseline.json] [--seed=2019]
+#                       [--depths=8,16,24,32] [--boards=3] [--variants=original,circular,luddy]
+#                       [--engines=astar,ida,bidirectional] [--width=4]
+#                       [--expanded-threshold=0.05] [--time-threshold=0.25]
+#                       [--time-slack=0.01] [--repeat=3] [--no-pdb]
+#
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import pattern_db
+import solve_luddy
+
+# Random walk of the empty cell from the goal that never undoes its last move
+def random_walk(rng, variant, n, length):
+    moves = solve_luddy.move_table(variant, n)
+    bits = solve_luddy.cell_bits(n)
+    code = solve_luddy.GOAL_CODES[n]
+    (empty, prev_empty) = (n*n-1, None)
+    for step in range(length):
+        choices = [ ind for (c, ind) in moves[empty] if ind != prev_empty ]
+        if not choices:
+            break
+        ind = rng.choice(choices)
+        code = solve_luddy.move_tile(code, empty, ind, bits)
+        (empty, prev_empty) = (ind, empty)
+    return solve_luddy.unpack_board(code, n)
+
+# Boards whose optimal route is exactly depth moves. Walks start at the target
+# length and grow by two (moves flip the parity of the empty cell's position)
+# since shortcuts make most walks shorter than they look
+def generate_boards(seed, variant, n, depth, count):
+    rng = random.Random("%s/%s/%d/%d" % (seed, variant, n, depth))
+    boards = []
+    length = depth
+    while len(boards) < count and length <= 4*depth:
+        for attempt in range(20):
+            board = random_walk(rng, variant, n, length)
+            route = solve_luddy.solve(board, variant)
+            if route is not False and len(route) == depth and board not in boards:
+                boards.append(board)
+                break
+        else:
+            length += 2
+    return boards
+
+def generate_corpus(seed, variants, n, depths, count):
+    return [ { "variant": variant, "depth": depth, "board": list(board) } \
+             for variant in variants for depth in depths \
+             for board in generate_boards(seed, variant, n, depth, count) ]
+
+# Run one engine over one board: the best of repeat timed runs, then a traced
+# run for memory
+def measure(board, variant, engine, repeat):
+    stats = {}
+    seconds = float("inf")
+    for attempt in range(repeat):
+        start_time = time.perf_counter()
+        route = solve_luddy.solve(board, variant, engine, stats)
+        seconds = min(seconds, time.perf_counter() - start_time)
+    tracemalloc.start()
+    solve_luddy.solve(board, variant, engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return { "moves": len(route) if route is not False else None, "expanded": stats["expanded"],
+             "seconds": seconds, "peak_kib": peak // 1024 }
+
+def run(corpus, engines, repeat):
+    groups = {}
+    for case in corpus:
+        for engine in engines:
+            result = measure(tuple(case["board"]), case["variant"], engine, repeat)
+            if result["moves"] != case["depth"]:
+                raise(Exception("Error: %s returned %s moves for a depth %d board %s" % \
+                                (engine, result["moves"], case["depth"], case["board"])))
+            key = "%s/%s/%d" % (engine, case["variant"], case["depth"])
+            group = groups.setdefault(key, { "boards": 0, "expanded": 0, "seconds": 0.0, "peak_kib": 0 })
+            group["boards"] += 1
+            group["expanded"] += result["expanded"]
+            group["seconds"] += result["seconds"]
+            group["peak_kib"] = max(group["peak_kib"], result["peak_kib"])
+    return groups
+
+# the pattern database each variant is solved with, None for the per-tile tables
+def pattern_databases(variants, n):
+    used = {}
+    for variant in variants:
+        pdb = solve_luddy.pattern_database(variant, n)
+        used[variant] = None if pdb is None else { "version": pattern_db.VERSION, "groups": pdb["groups"] }
+    return used
+
+# groups that got worse than the baseline by more than the thresholds
+def regressions(baseline, groups, expanded_threshold, time_threshold, time_slack):
+    found = []
+    for (key, group) in sorted(groups.items()):
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        if group["expanded"] > old["expanded"] * (1 + expanded_threshold):
+            found.append("%s: expanded %d -> %d" % (key, old["expanded"], group["expanded"]))
+        if group["seconds"] > old["seconds"] * (1 + time_threshold) + time_slack:
+            found.append("%s: seconds %.3f -> %.3f" % (key, old["seconds"], group["seconds"]))
+    return found
+
+if __name__ == "__main__":
+    options = { "baseline": os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"),
+                "seed": "2019", "depths": "8,16,24,32", "boards": "3", "variants": "original,circular,luddy",
+                "engines": "astar,ida,bidirectional", "width": "4",
+                "expanded-threshold": "0.05", "time-threshold": "0.25", "time-slack": "0.01", "repeat": "3" }
+    record = False
+    for option in sys.argv[1:]:
+        (key, value) = option[2:].split("=", 1) if "=" in option else (option[2:], "")
+        if option == "--record":
+            record = True
+        elif option == "--no-pdb":
+            solve_luddy.USE_PATTERN_DATABASE = False
+        elif option.startswith("--") and key in options:
+            options[key] = value
+        else:
+            raise(Exception("Error: unsupported option " + option))
+
+    # a comparison reruns the corpus stored with the baseline
+    baseline = None
+    if not record and os.path.exists(options["baseline"]):
+        with open(options["baseline"], "r") as file:
+            baseline = json.load(file)
+        corpus = baseline["corpus"]
+        variants = sorted(set(case["variant"] for case in corpus))
+        (used, recorded) = (pattern_databases(variants, baseline["width"]), baseline.get("pattern_databases"))
+        if recorded is None or any(recorded.get(variant) != used[variant] for variant in variants):
+            raise(Exception("Error: the baseline was recorded with pattern databases %s but this run uses %s, "
+                            "record a new baseline or match them (--no-pdb)" % (json.dumps(recorded), json.dumps(used))))
+    else:
+        corpus = generate_corpus(options["seed"], options["variants"].split(","), int(options["width"]),
+                                 [ int(d) for d in options["depths"].split(",") ], int(options["boards"]))
+    groups = run(corpus, options["engines"].split(","), int(options["repeat"]))
+    for (key, group) in sorted(groups.items()):
+        print("%-28s boards %2d  expanded %9d  seconds %8.3f  peak %8d KiB" % \
+              (key, group["boards"], group["expanded"], group["seconds"], group["peak_kib"]))
+
+    if record:
+        with open(options["baseline"], "w") as file:
+            json.dump({ "seed": options["seed"], "width": int(options["width"]), "corpus": corpus,
+                        "pattern_databases": pattern_databases(options["variants"].split(","), int(options["width"])),
+                        "groups": groups }, file, indent=1)
+        print("Baseline written to " + options["baseline"])
+    elif baseline is not None:
+        found = regressions(baseline["groups"], groups, float(options["expanded-threshold"]),
+                            float(options["time-threshold"]), float(options["time-slack"]))
+        for line in found:
+            print("REGRESSION " + line)
+        sys.exit(1 if found else 0)
+    else:
+        print("No baseline at " + options["baseline"] + ", run with --record to create one")
@@ -0,0 +1,158 @@
+#!/usr/local/bin/python3
+# pattern_db.py : Additive pattern databases for the sliding tile puzzle
+#
+# The tiles are split into disjoint groups. For every placement of a group's
+# tiles the database stores the minimum number of moves of *those* tiles
+# needed to bring them home, found by a retrograde BFS from the goal over the
+# variant's move set where other tiles and the empty cell are ignored. Each
+# move of the puzzle moves exactly one tile, so the values of the groups can
+# be added and the sum is still admissible.
+#
+# A group of k tiles is indexed by the cells of its tiles, 4 bits per tile:
+#   index = cell(tile_0) + 16*cell(tile_1) + ... + 16^(k-1)*cell(tile_k-1)
+# which wastes some entries but lets a move update the index with one add.
+#
+# File layout: magic, header length, a JSON header (variant, groups, offsets)
+# and then one byte per entry for each group. The file is memory-mapped
+# read-only, so every solver process shares the same pages.
+#
+# Usage: ./pattern_db.py variant [partition]
+#
+import json
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+MAGIC = b"LPDB"
+VERSION = 2
+
+# Disjoint tile groups - 6-6-3 is the strongest, the smaller ones build in seconds
+PARTITIONS = {
+    "6-6-3": [(1, 5, 6, 9, 10, 13), (7, 8, 11, 12, 14, 15), (2, 3, 4)],
+    "5-5-5": [(1, 2, 5, 6, 9), (3, 4, 7, 8, 12), (10, 11, 13, 14, 15)],
+    "3-3-3-3-3": [(1, 2, 5), (3, 4, 8), (6, 9, 10), (7, 11, 12), (13, 14, 15)],
+}
+
+UNSEEN = 255
+
+# where the database of a variant is kept
+def database_path(variant):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), variant + ".pdb")
+
+#------------Building--------------------------
+# Retrograde BFS for one group. moves[cell] lists the (move, cell) pairs a
+# cell can swap with. The abstract state is the group's index alone: a tile
+# of the group may step to any neighbouring cell its group does not hold, and
+# every step costs 1. A puzzle move changes one group's index by at most one
+# such step, so the heuristic changes by at most 1 and stays consistent.
+def build_group(group, moves):
+    k = len(group)
+    dist = np.full(16 ** k, UNSEEN, dtype=np.uint8)
+    goal = sum((tile-1) << (4*rank) for (rank, tile) in enumerate(group))
+    dist[goal] = 0
+
+    # next_cell[m][cell] is the cell reached from cell on move m, or -1
+    width = max(len(m) for m in moves)
+    next_cell = np.full((width, 16), -1, dtype=np.int64)
+    for cell in range(16):
+        for (m, (c, ind)) in enumerate(moves[cell]):
+            next_cell[m][cell] = ind
+
+    level = np.array([goal], dtype=np.int64)
+    cost = 0
+    while len(level) > 0:
+        level = np.unique(np.concatenate(list(expand(level, next_cell, k))))
+        level = level[dist[level] == UNSEEN]
+        dist[level] = cost+1
+        cost += 1
+    return dist
+
+# successors of a batch of abstract states, one array per tile and move
+def expand(states, next_cell, k):
+    cells = [ (states >> (4*rank)) & 15 for rank in range(k) ]
+    for rank in range(k):
+        for m in range(len(next_cell)):
+            target = next_cell[m][cells[rank]]
+            valid = target >= 0
+            for other in range(k):
+                if other != rank:
+                    valid &= cells[other] != target
+            yield states[valid] + ((target[valid] - cells[rank][valid]) << (4*rank))
+
+def build(variant, groups, moves, path):
+    tables = [ build_group(group, moves) for group in groups ]
+    offsets = []
+    offset = 0
+    for table in tables:
+        offsets.append(offset)
+        offset += len(table)
+    header = json.dumps({ "version": VERSION, "variant": variant, "groups": [ list(g) for g in groups ],
+                          "offsets": offsets }).encode()
+    with open(path, "wb") as file:
+        file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for table in tables:
+            file.write(table.tobytes())
+#------------Building Ended--------------------------
+
+#------------Lookup--------------------------
+# Memory-map a database. Returns None when there is no (usable) file so the
+# caller can fall back to its own heuristic
+def load(variant, path=None):
+    path = path or database_path(variant)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:4] != MAGIC:
+        return None
+    length = struct.unpack("<I", data[4:8])[0]
+    header = json.loads(data[8:8+length].decode())
+    if header["version"] != VERSION or header["variant"] != variant:
+        return None
+    view = memoryview(data)[8+length:]
+    group_of = {}
+    shift = {}
+    for (g, group) in enumerate(header["groups"]):
+        for (rank, tile) in enumerate(group):
+            group_of[tile] = g
+            shift[tile] = 4*rank
+    return { "variant": variant, "groups": header["groups"], "group_of": group_of, "shift": shift,
+             "tables": [ view[offset:offset + 16 ** len(group)] \
+                         for (offset, group) in zip(header["offsets"], header["groups"]) ] }
+
+# index of every group for a packed board (4 bits per cell, cell 0 lowest)
+def group_indices(pdb, code):
+    indices = [0] * len(pdb["groups"])
+    for cell in range(16):
+        tile = (code >> (4*cell)) & 15
+        if tile > 0:
+            indices[pdb["group_of"][tile]] += cell << pdb["shift"][tile]
+    return indices
+
+def value(pdb, indices):
+    return sum(table[index] for (table, index) in zip(pdb["tables"], indices))
+
+# change of the heuristic when tile moves from cell ind into the empty cell
+def move_delta(pdb, indices, tile, ind, empty):
+    g = pdb["group_of"][tile]
+    table = pdb["tables"][g]
+    return table[indices[g] + ((empty - ind) << pdb["shift"][tile])] - table[indices[g]]
+#------------Lookup Ended--------------------------
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        raise(Exception("Error: expected a variant and an optional partition"))
+
+    import solve_luddy
+
+    variant = sys.argv[1]
+    partition = sys.argv[2] if len(sys.argv) == 3 else "6-6-3"
+    if variant not in ("original", "circular", "luddy"):
+        raise(Exception("Error: unsupported variant entered -- all characters need to be small!"))
+    if partition not in PARTITIONS:
+        raise(Exception("Error: unsupported partition, expected one of " + ", ".join(PARTITIONS)))
+
+    build(variant, PARTITIONS[partition], solve_luddy.move_table(variant), database_path(variant))
+    print("Wrote " + database_path(variant))
@@ -0,0 +1,147 @@
+#!/usr/local/bin/python3
+# solve_batch.py : Solve many sliding tile boards in one run
+#
+# Boards come from a directory of board files (each solved for every variant
+# given with --variants) or from a JSONL stream, one object per line:
+#   {"id": "b1", "board": [1, 2, 3, ...], "variant": "luddy"}
+# where "id" and "variant" are optional; a line that is not such an object is
+# reported as invalid. Boards are handed to a process pool as they are read, so
+# interpreter start-up and the heuristic tables are paid once per worker, not
+# once per board, and a stream on stdin is solved while it is still being
+# written. Unsolvable boards are reported before any search, and each board
+# gets its own time limit. One JSON result per line is written to stdout as
+# soon as it is ready.
+#
+# Usage: ./solve_batch.py (directory | boards.jsonl | -) [--variants=original,circular,luddy]
+#                         [--engine=astar] [--timeout=60] [--workers=N]
+#
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import solve_luddy
+
+VARIANTS = ("original", "circular", "luddy")
+
+class SolveTimeout(Exception):
+    pass
+
+def on_alarm(signum, frame):
+    raise SolveTimeout()
+
+def init_worker():
+    signal.signal(signal.SIGALRM, on_alarm)
+
+# list the (id, board, variant) jobs of a directory of board files
+def directory_jobs(path, variants):
+    for name in sorted(os.listdir(path)):
+        if os.path.isfile(os.path.join(path, name)):
+            try:
+                board = solve_luddy.read_board(os.path.join(path, name))
+            except ValueError:
+                board = ()
+            for variant in variants:
+                yield (name, board, variant)
+
+# list the (id, board, variant) jobs of a JSONL stream, a line that is not a
+# board object is one job with an empty board
+def stream_jobs(file, variants):
+    for (number, line) in enumerate(file):
+        if line.strip():
+            try:
+                job = json.loads(line)
+                (job_id, board) = (job.get("id", number), job["board"])
+                requested = [job["variant"]] if "variant" in job else variants
+            except (ValueError, KeyError, TypeError, AttributeError):
+                yield (number, (), None)
+                continue
+            if not isinstance(board, list) or not all(isinstance(tile, int) for tile in board):
+                board = []
+            for variant in requested:
+                yield (job_id, tuple(board), variant)
+
+# Solve one board in a worker, the alarm interrupts the search on timeout and
+# any other failure of the search is reported as an error for that board
+def solve_job(args):
+    (job_id, board, variant, engine, timeout) = args
+    result = check_job(job_id, board, variant)
+    if result is not None:
+        return result
+    result = { "id": job_id, "variant": variant }
+    stats = {}
+    start_time = time.time()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        route = solve_luddy.solve(board, variant, engine, stats)
+        result["status"] = "solved" if route is not False else "failed"
+        if route is not False:
+            result["moves"] = len(route)
+            result["route"] = route
+    except SolveTimeout:
+        result["status"] = "timeout"
+    except Exception as error:
+        # such as a MemoryError on a large search, the other boards go on
+        (result["status"], result["message"]) = ("error", repr(error))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    result["expanded"] = stats.get("expanded")
+    result["seconds"] = time.time() - start_time
+    return result
+
+# results of the jobs that can be answered without a search
+def check_job(job_id, board, variant):
+    if not solve_luddy.valid_board(board):
+        return { "id": job_id, "variant": variant, "status": "invalid" }
+    if variant not in VARIANTS:
+        return { "id": job_id, "variant": variant, "status": "unsupported variant" }
+    if not solve_luddy.is_solution(board, variant):
+        return { "id": job_id, "variant": variant, "status": "unsolvable" }
+    return None
+
+def emit(result):
+    print(json.dumps(result), flush=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise(Exception("Error: expected a board directory or JSONL file"))
+
+    variants = list(VARIANTS)
+    engine = "astar"
+    timeout = 60.0
+    workers = os.cpu_count()
+    for option in sys.argv[2:]:
+        (key, value) = option.split("=", 1) if "=" in option else (option, "")
+        if key == "--variants":
+            variants = value.split(",")
+        elif key == "--engine" and value in solve_luddy.ENGINES:
+            engine = value
+        elif key == "--timeout":
+            timeout = float(value)
+        elif key == "--workers":
+            workers = int(value)
+        else:
+            raise(Exception("Error: unsupported option " + option))
+
+    source = sys.argv[1]
+    if os.path.isdir(source):
+        jobs = directory_jobs(source, variants)
+    elif source == "-":
+        jobs = stream_jobs(sys.stdin, variants)
+    else:
+        jobs = stream_jobs(open(source, 'r'), variants)
+
+    # at most this many boards are read ahead of the results written
+    window = threading.BoundedSemaphore(4*workers)
+
+    def queued(jobs):
+        for (job_id, board, variant) in jobs:
+            window.acquire()
+            yield (job_id, board, variant, engine, timeout)
+
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(solve_job, queued(jobs)):
+            window.release()
+            emit(result)
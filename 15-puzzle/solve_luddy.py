@@ -5,17 +5,23 @@
 #
 # Based on skeleton code by D. Crandall, September 2019
 #
-from queue import PriorityQueue
+import heapq
+import os
 import sys
-import numpy as np
+import pattern_db
 import time
 import math
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import searchstats
 
 # Original moves
 MOVES = { "R": (0, -1), "L": (0, 1), "D": (-1, 0), "U": (1,0) }
 
-# Circular moves
-CMOVES = { "R": [(0, -1),(0,-3)], "L": [(0, 1),(0,3)], "D": [(-1, 0),(-3,0)], "U": [(1,0),(3,0)] }
+# Circular moves - the second offset of each move wraps around a board of width n
+def circular_move_set(n):
+    return { "R": [(0, -1),(0,1-n)], "L": [(0, 1),(0,n-1)], "D": [(-1, 0),(1-n,0)], "U": [(1,0),(n-1,0)] }
+
+CMOVES = circular_move_set(4)
 
 def circular_moves(CMOVES):
     return [(c,val[k]) for (c, val) in CMOVES.items() for k in range(2)]
@@ -23,23 +29,35 @@ def circular_moves(CMOVES):
 # Luddy moves
 LMOVES = { "A": (2,1), "B": (2,-1), "C": (-2,1), "D":(-2,-1), "E": (1,2), "F": (1,-2), "G": (-1,2), "H": (-1,-2) }
 
-def rowcol2ind(row, col):
-    return row*4 + col
+# Boards are square, from 3x3 up to 6x6
+MIN_WIDTH = 3
+MAX_WIDTH = 6
+
+def board_width(board):
+    return math.isqrt(len(board))
+
+# a square board of a supported width holding each tile exactly once
+def valid_board(board):
+    return MIN_WIDTH <= board_width(board) <= MAX_WIDTH and sorted(board) == list(range(board_width(board)**2))
 
-def ind2rowcol(ind):
-    return (int(ind/4), ind % 4)
+def rowcol2ind(row, col, n=4):
+    return row*n + col
 
-def valid_index(row, col):
-    return 0 <= row <= 3 and 0 <= col <= 3
+def ind2rowcol(ind, n=4):
+    return (ind // n, ind % n)
+
+def valid_index(row, col, n=4):
+    return 0 <= row < n and 0 <= col < n
 
 def swap_ind(list, ind1, ind2):
     return list[0:ind1] + (list[ind2],) + list[ind1+1:ind2] + (list[ind1],) + list[ind2+1:]
 
-def swap_tiles(state, row1, col1, row2, col2):
-    return swap_ind(state, *(sorted((rowcol2ind(row1,col1), rowcol2ind(row2,col2)))))
+def swap_tiles(state, row1, col1, row2, col2, n=4):
+    return swap_ind(state, *(sorted((rowcol2ind(row1,col1,n), rowcol2ind(row2,col2,n)))))
 
 def printable_board(row):
-    return [ '%3d %3d %3d %3d'  % (row[j:(j+4)]) for j in range(0, 16, 4) ]
+    n = board_width(row)
+    return [ ' '.join(['%3d']*n) % (row[j:(j+n)]) for j in range(0, n*n, n) ]
   
 #------------Heuristic Started--------------------------
 # check if we've reached the goal
@@ -48,16 +66,10 @@ def is_goal_heuristic(state,i):
 
 # return a list of possible successor states
 def successors_heuristic(state,i,variant):
-    (empty_row, empty_col) = ind2rowcol(state.index(i))
-    if variant == 'luddy':
-        return [ (swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                     for (c, (i, j)) in LMOVES.items() if valid_index(empty_row+i, empty_col+j) ]
-    if variant == 'circular':
-        return [ (swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                     for (c, (i, j)) in circular_moves(CMOVES) if valid_index(empty_row+i, empty_col+j) ]
-    if variant == 'original':
-        return [ (swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                     for (c, (i, j)) in MOVES.items() if valid_index(empty_row+i, empty_col+j) ]
+    n = board_width(state)
+    (empty_row, empty_col) = ind2rowcol(state.index(i), n)
+    return [ (swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j, n), c) \
+                 for (c, (i, j)) in variant_moves(variant, n) if valid_index(empty_row+i, empty_col+j, n) ]
        
 # The solver for heuristic - uses BFS!
 def solve_heuristic(initial_board,i,variant):
@@ -75,86 +87,386 @@ def solve_heuristic(initial_board,i,variant):
 
     return math.inf
 
-def heuristic(board,variant):
+# Per-tile BFS heuristic - kept to verify the distance tables below
+def heuristic_bfs(board,variant):
     cost=0
-    for i in start_state:
+    for i in board:
         if i>0:
             cost+= solve_heuristic(board,i,variant)
     return cost
+
+# return the (move, (row, col)) pairs a single tile can take for the variant
+def variant_moves(variant, n=4):
+    if variant == 'luddy':
+        return list(LMOVES.items())
+    if variant == 'circular':
+        return circular_moves(circular_move_set(n))
+    if variant == 'original':
+        return list(MOVES.items())
+
+# Exact number of moves a lone tile needs to get from one cell to another,
+# one table per variant and board width, built lazily by a BFS from every cell
+DISTANCE_TABLES = {}
+
+def distance_table(variant, n=4):
+    if (variant, n) not in DISTANCE_TABLES:
+        table = []
+        for start in range(n*n):
+            dist = [math.inf]*(n*n)
+            dist[start] = 0
+            fringe = [start]
+            for ind in fringe:
+                (row, col) = ind2rowcol(ind, n)
+                for (c, (i, j)) in variant_moves(variant, n):
+                    if valid_index(row+i, col+j, n) and dist[rowcol2ind(row+i, col+j, n)] == math.inf:
+                        dist[rowcol2ind(row+i, col+j, n)] = dist[ind]+1
+                        fringe.append(rowcol2ind(row+i, col+j, n))
+            table.append(dist)
+        DISTANCE_TABLES[(variant, n)] = table
+    return DISTANCE_TABLES[(variant, n)]
+
+# When set, every table lookup is checked against the per-tile BFS heuristic
+VERIFY_HEURISTIC = False
+
+# sum of the minimum number of moves each tile needs to reach its goal position
+def tile_heuristic(board,variant):
+    table = distance_table(variant, board_width(board))
+    cost = sum(table[ind][i-1] for (ind, i) in enumerate(board) if i>0)
+    if VERIFY_HEURISTIC and cost != heuristic_bfs(board,variant):
+        raise(Exception("Error: distance table disagrees with BFS heuristic for " + str(board)))
+    return cost
+
+# Additive pattern database of each variant, memory-mapped on first use;
+# None when no database file has been built (see pattern_db.py) or the
+# board is not 4x4
+USE_PATTERN_DATABASE = True
+PATTERN_DATABASES = {}
+
+def pattern_database(variant, n=4):
+    if not USE_PATTERN_DATABASE or n != 4:
+        return None
+    if variant not in PATTERN_DATABASES:
+        PATTERN_DATABASES[variant] = pattern_db.load(variant)
+    return PATTERN_DATABASES[variant]
+
+# pattern database value when the variant has one, per-tile distances otherwise
+def heuristic(board,variant):
+    pdb = pattern_database(variant, board_width(board))
+    if pdb is None:
+        return tile_heuristic(board,variant)
+    return pattern_db.value(pdb, pattern_db.group_indices(pdb, pack_board(board)))
 #------------Heauristic Ended--------------------------
 
 # calculate permutation Inversionfor a state
+# On even widths a vertical move also changes the row of the empty cell, so
+# its row (counted from 1) is added; on odd widths the inversions alone decide
 def permutation_inversion(state):
     state = list(state)
+    n = board_width(state)
     return sum([len([state[j] for j in range(i+1,len(state)) if state[j] != 0 and state[j] < val]) \
-                for i,val in enumerate(state)]) + int(np.where(np.array([state[i:i+4] \
-                                      for i in range(0, len(state), 4)]) == 0)[0])+1
+                for i,val in enumerate(state)]) + (state.index(0) // n + 1 if n % 2 == 0 else 0)
 
-# does goal exists for a state    
-def is_solution(state):
+# does goal exists for a state. On odd widths a circular wrap move carries a
+# tile past an odd number of others (n-2 across a row, n*(n-1)-1 across the
+# board) and flips the parity, with no row term to make up for it, so both
+# parities are reachable and the test does not apply
+def is_solution(state, variant="original"):
+    if variant == "circular" and board_width(state) % 2 == 1:
+        return True
     return permutation_inversion(state)%2 == 0
     
-# return a list of possible successor states
-def successors(gs,state,variant):
-    (empty_row, empty_col) = ind2rowcol(state.index(0))
-    if variant == 'circular':
-        return [ (gs+heuristic(swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j),variant), \
-                  swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                 for (c, (i, j)) in circular_moves(CMOVES) if valid_index(empty_row+i, empty_col+j) ]
-    elif variant == 'original':
-        return [ (gs+heuristic(swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j),variant), \
-                  swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                 for (c, (i, j)) in MOVES.items() if valid_index(empty_row+i, empty_col+j) ]
-    elif variant == 'luddy':
-        return [ (gs+heuristic(swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j),variant), \
-                  swap_tiles(state, empty_row, empty_col, empty_row+i, empty_col+j), c) \
-                 for (c, (i, j)) in LMOVES.items() if valid_index(empty_row+i, empty_col+j) ]
+#------------Packed boards--------------------------
+# A board is packed into a single int used as an array of fixed-width cells,
+# 4 bits per cell up to 4x4, 5 bits on 5x5 and 6 bits on 6x6, with cell 0 in the lowest
+# bits, so a state costs n*n*cell_bits(n) bits whatever the tiles are. The
+# empty cell is a zero cell, so moving a tile into it is two XORs and the
+# packed ints can go straight into sets and dicts
+def cell_bits(n):
+    return max(4, (n*n-1).bit_length())
+
+def pack_board(board):
+    bits = cell_bits(board_width(board))
+    return sum(tile << (bits*ind) for (ind, tile) in enumerate(board))
+
+def unpack_board(code, n=4):
+    bits = cell_bits(n)
+    return tuple((code >> (bits*ind)) & ((1 << bits)-1) for ind in range(n*n))
+
+# move the tile at cell ind into the empty cell
+def move_tile(code, empty, ind, bits=4):
+    tile = (code >> (bits*ind)) & ((1 << bits)-1)
+    return code ^ (tile << (bits*ind)) ^ (tile << (bits*empty))
+
+def goal_board(n):
+    return tuple(range(1, n*n)) + (0,)
+
+GOAL_CODES = { n: pack_board(goal_board(n)) for n in range(MIN_WIDTH, MAX_WIDTH+1) }
+GOAL_CODE = GOAL_CODES[4]
+
+# For each empty cell, the (move, cell) pairs the empty cell can swap with,
+# built once per variant and board width
+MOVE_TABLES = {}
+
+def move_table(variant, n=4):
+    if (variant, n) not in MOVE_TABLES:
+        MOVE_TABLES[(variant, n)] = [ [ (c, rowcol2ind(row+i, col+j, n)) for (c, (i, j)) in variant_moves(variant, n) \
+                                        if valid_index(row+i, col+j, n) ] \
+                                      for (row, col) in [ ind2rowcol(ind, n) for ind in range(n*n) ] ]
+    return MOVE_TABLES[(variant, n)]
+#------------Packed boards Ended--------------------------
+
+# return a list of possible successor states with their f(s), h(s) and empty cell
+# A move only relocates the tile swapped into the empty cell, so h(s) of the
+# child is the parent's h(s) corrected by that one tile's table distances, or
+# by the change in its group's pattern database entry
+def successors(gs,hs,code,empty,variant,n=4):
+    bits = cell_bits(n)
+    table = distance_table(variant, n)
+    pdb = pattern_database(variant, n)
+    if pdb is not None:
+        indices = pattern_db.group_indices(pdb, code)
+    succ = []
+    for (c, ind) in move_table(variant, n)[empty]:
+        tile = (code >> (bits*ind)) & ((1 << bits)-1)
+        if pdb is None:
+            new_hs = hs - table[ind][tile-1] + table[empty][tile-1]
+        else:
+            new_hs = hs + pattern_db.move_delta(pdb, indices, tile, ind, empty)
+        new_code = move_tile(code, empty, ind, bits)
+        if VERIFY_HEURISTIC and new_hs != heuristic(unpack_board(new_code, n),variant):
+            raise(Exception("Error: incremental heuristic disagrees with table for " + str(unpack_board(new_code, n))))
+        succ.append((gs+new_hs, new_hs, new_code, ind, c))
+    return succ
 
 # check if we've reached the goal
-def is_goal(state):
-    return sorted(state[:-1]) == list(state[:-1]) and state[-1]==0
-
-# The solver! - considers g(s)+h(s)
-def solve(initial_board,variant):
-    closed = []
-    fringe = PriorityQueue()
-    fringe.put((0,initial_board,""))
-    while not fringe.empty():
-        (cost,state, route_so_far) = fringe.get()
-        closed.append(state)
-        if is_goal(state):
-            return( route_so_far )
-        for (fs,succ,move) in successors( len(route_so_far)+1, state, variant ):
-            if (succ not in closed):
-                fringe.put((fs,succ, route_so_far + move))
+def is_goal(code, n=4):
+    return code == GOAL_CODES[n]
+
+# walk the parent pointers back from a state to rebuild its route
+def route_to(parent, code):
+    route = []
+    while parent[code][0] is not None:
+        (code, move) = parent[code][:2]
+        route.append(move)
+    return "".join(reversed(route))
+
+# The A* solver! - considers g(s)+h(s)
+# parent maps each generated state to (parent state, move, g(s)), so the fringe
+# holds no routes and a state is only re-queued when reached by a shorter path.
+# The number of expanded and generated states is written to stats if given,
+# with queue and expansion times for stats made by searchstats.new(). Only the
+# start board gets a full heuristic (root_heuristic); children are updated
+# incrementally inside successors(), so their heuristic time is under expand
+def solve_astar(initial_board,variant,stats=None):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    expand = searchstats.timed(stats, "expand", successors)
+    n = board_width(initial_board)
+    start = pack_board(initial_board)
+    closed = set()
+    parent = { start: (None, "", 0) }
+    hs = searchstats.timed(stats, "root_heuristic", heuristic)(initial_board,variant)
+    fringe = [ (hs, hs, start, initial_board.index(0)) ]
+    route = False
+    while fringe:
+        (cost,hs,code,empty) = pop(fringe)
+        if code in closed:
+            continue
+        closed.add(code)
+        if is_goal(code, n):
+            route = route_to(parent, code)
+            break
+        gs = parent[code][2]+1
+        for (fs,new_hs,succ,succ_empty,move) in expand( gs, hs, code, empty, variant, n ):
+            if succ not in closed and (succ not in parent or gs < parent[succ][2]):
+                parent[succ] = (code, move, gs)
+                push(fringe, (fs,new_hs,succ,succ_empty))
+    if stats is not None:
+        stats["expanded"] = len(closed)
+        stats["generated"] = len(parent)
+        stats["peak_closed"] = len(closed)
+    return route
+
+# Depth-first search below a bound on f(s) for IDA*. Returns True once the
+# goal is reached (route then holds the moves), otherwise the smallest f(s)
+# that went over the bound. Moving the empty cell straight back to where it
+# came from is the inverse move of every variant, so it is never tried
+def ida_search(code, empty, prev_empty, gs, hs, bound, route, variant, stats, n=4):
+    if gs+hs > bound:
+        return gs+hs
+    if is_goal(code, n):
+        return True
+    children = [ child for child in sorted(successors( gs+1, hs, code, empty, variant, n )) if child[3] != prev_empty ]
+    if stats is not None:
+        stats["expanded"] += 1
+        stats["generated"] += len(children)
+        if children and searchstats.enabled(stats):
+            searchstats.peak(stats, "peak_frontier", len(route)+1)
+    next_bound = math.inf
+    for (fs,new_hs,succ,succ_empty,move) in children:
+        route.append(move)
+        t = ida_search(succ, succ_empty, empty, gs+1, new_hs, bound, route, variant, stats, n)
+        if t is True:
+            return True
+        route.pop()
+        next_bound = min(next_bound, t)
+    return next_bound
+
+# The IDA* solver! - iterative deepening on g(s)+h(s), memory is linear in
+# the solution depth as only the current route is kept. States expanded and
+# generated over all iterations are counted in stats if given. The route is
+# the only frontier, so for stats made by searchstats.new() its peak is the
+# deepest route the search reached
+def solve_ida(initial_board,variant,stats=None):
+    if stats is not None:
+        (stats["expanded"], stats["generated"]) = (0, 0)
+    n = board_width(initial_board)
+    start = pack_board(initial_board)
+    hs = searchstats.timed(stats, "root_heuristic", heuristic)(initial_board,variant)
+    bound = hs
+    route = []
+    while bound != math.inf:
+        t = ida_search(start, initial_board.index(0), None, 0, hs, bound, route, variant, stats, n)
+        if t is True:
+            return "".join(route)
+        bound = t
     return False
 
+# letter of the move that undoes each move of the variant
+def inverse_moves(variant):
+    offsets = variant_moves(variant)
+    return { c: d for (c, (i, j)) in offsets for (d, (k, l)) in offsets if (k, l) == (-i, -j) }
+
+# pop stale entries (states closed since they were queued) off a fringe
+def fringe_top(fringe, closed):
+    while fringe and fringe[0][2] in closed:
+        heapq.heappop(fringe)
+    return fringe[0][0] if fringe else math.inf
+
+# The bidirectional A* solver! - a forward search from the board towards the
+# goal and a backward one from the goal towards the board, each ordered by its
+# own g(s)+h(s). The backward h(s) is the per-tile distance to the tile's cell
+# on the initial board. The smaller fringe is expanded next, and the search
+# stops once the best meeting cost found is no more than the smallest f(s) left
+# on either side, so the route is optimal; children that cannot beat it are
+# dropped. Every move is undone by its inverse,
+# so the backward half of the route is replayed with inverted moves. Stats are
+# kept as for A*, with both directions' states and times added together
+def solve_bidirectional(initial_board,variant,stats=None):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    expand = searchstats.timed(stats, "expand", successors)
+    n = board_width(initial_board)
+    bits = cell_bits(n)
+    table = distance_table(variant, n)
+    moves = move_table(variant, n)
+    inverse = inverse_moves(variant)
+    home = [0]*(n*n)
+    for (ind, tile) in enumerate(initial_board):
+        home[tile] = ind
+
+    start = pack_board(initial_board)
+    goal = GOAL_CODES[n]
+    hs = searchstats.timed(stats, "root_heuristic", heuristic)(initial_board,variant)
+    parents = ( { start: (None, "", 0) }, { goal: (None, "", 0) } )
+    closed = ( set(), set() )
+    back_hs = sum(table[ind][home[tile]] for (ind, tile) in enumerate(goal_board(n)) if tile > 0)
+    fringes = ( [ (hs, hs, start, initial_board.index(0)) ], [ (back_hs, back_hs, goal, n*n-1) ] )
+    (best, meet) = ((0, start) if start == goal else (math.inf, None))
+
+    while best > max(fringe_top(fringes[0], closed[0]), fringe_top(fringes[1], closed[1])):
+        side = 0 if len(fringes[0]) <= len(fringes[1]) else 1
+        (cost,hs,code,empty) = pop(fringes[side])
+        closed[side].add(code)
+        (parent, other) = (parents[side], parents[1-side])
+        gs = parent[code][2]+1
+        if side == 0:
+            children = [ (new_hs, succ, succ_empty, move) for (fs,new_hs,succ,succ_empty,move) \
+                         in expand( gs, hs, code, empty, variant, n ) ]
+        else:
+            children = []
+            for (move, ind) in moves[empty]:
+                tile = (code >> (bits*ind)) & ((1 << bits)-1)
+                children.append((hs - table[ind][home[tile]] + table[empty][home[tile]],
+                                 move_tile(code, empty, ind, bits), ind, move))
+        for (new_hs,succ,succ_empty,move) in children:
+            if gs+new_hs >= best:
+                continue
+            if succ not in closed[side] and (succ not in parent or gs < parent[succ][2]):
+                parent[succ] = (code, move, gs)
+                push(fringes[side], (gs+new_hs,new_hs,succ,succ_empty))
+                if succ in other and gs + other[succ][2] < best:
+                    (best, meet) = (gs + other[succ][2], succ)
+
+    if stats is not None:
+        stats["expanded"] = len(closed[0]) + len(closed[1])
+        stats["generated"] = len(parents[0]) + len(parents[1])
+        stats["peak_closed"] = len(closed[0]) + len(closed[1])
+    if meet is None:
+        return False
+    route = route_to(parents[0], meet)
+    code = meet
+    while parents[1][code][0] is not None:
+        (code, move) = parents[1][code][:2]
+        route += inverse[move]
+    return route
+
+ENGINES = { "astar": solve_astar, "ida": solve_ida, "bidirectional": solve_bidirectional }
+
+# The solver! - runs the selected search engine
+def solve(initial_board,variant,engine="astar",stats=None):
+    return ENGINES[engine](initial_board,variant,stats)
+
+# read a board file, whitespace separated tiles row by row
+def read_board(filename):
+    board = []
+    with open(filename, 'r') as file:
+        for line in file:
+            board += [ int(i) for i in line.split() ]
+    return tuple(board)
+
 # main function
 if __name__ == "__main__":
     start_time = time.time()
     
-    if(len(sys.argv) != 3):
+    if(len(sys.argv) < 3):
         raise(Exception("Error: expected 2 arguments"))
 
-    start_state = []
-    with open(sys.argv[1], 'r') as file:
-        for line in file:
-            start_state += [ int(i) for i in line.split() ]
+    # optional flags after the board file and variant; --stats writes search
+    # statistics as JSON to stderr and --profile=(cprofile|sample) profiles the search
+    engine = "astar"
+    (stats, profiler, options) = searchstats.parse_options(sys.argv[3:])
+    for option in options:
+        if option == "--verify-heuristic":
+            VERIFY_HEURISTIC = True
+        elif option == "--no-pdb":
+            USE_PATTERN_DATABASE = False
+        elif option.startswith("--engine=") and option[len("--engine="):] in ENGINES:
+            engine = option[len("--engine="):]
+        else:
+            raise(Exception("Error: unsupported option " + option))
+
+    with searchstats.phase(stats, "parse"):
+        start_state = read_board(sys.argv[1])
 
     if not (sys.argv[2] == "original" or sys.argv[2] == "circular" or sys.argv[2] == "luddy"):
         raise(Exception("Error: unsupported variant entered -- all characters need to be small!"))
 
-    if len(start_state) != 16:
+    if not valid_board(start_state):
         raise(Exception("Error: couldn't parse start state file"))
 
     print("Start state: \n" +"\n".join(printable_board(tuple(start_state))))
     
     variant = sys.argv[2]  
-    if is_solution(start_state):
+    if is_solution(start_state, variant):
         print("Solving...")
-        route = solve(tuple(start_state),variant)
+        with searchstats.phase(stats, "search"):
+            route = searchstats.profiled(profiler, solve, tuple(start_state), variant, engine, stats)
         print("--- %s seconds ---" % (time.time() - start_time))
-        print("Solution found in " + str(len(route)) + " moves:" + "\n" + route)
+        if stats is not None:
+            searchstats.report(stats)
+        if route is False:
+            print("Inf")
+        else:
+            print("Solution found in " + str(len(route)) + " moves:" + "\n" + route)
     else:
         print(permutation_inversion(start_state))
         print("Inf")
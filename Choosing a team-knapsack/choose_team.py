@@ -6,8 +6,50 @@
 #
 # Based on skeleton code by D. Crandall, September 2019
 #
+# Engines (--engine=):
+# bnb  : best-first branch and bound over the robots sorted by skill/rate. The
+#        fractional bound of a node is found with a binary search on prefix
+#        sums of the rates instead of a loop, and every node is a distinct
+#        team, so no list of explored teams is needed
+# dp   : dynamic program over the budget in integer units; rates are scaled by
+#        the smallest power of ten that makes them whole numbers
+# mitm : meet in the middle, every team of each half of the robots is listed
+#        and each team of one half is matched with the best affordable team of
+#        the other by binary search, for up to about 40 robots
+# core : fixes the robots far from the greedy break robot and solves a small
+#        core exactly, growing it until the fixing is proven; the file is
+#        streamed into columns instead of a dict of lists (core_knapsack.py)
+# auto : (default) bnb for a handful of robots, otherwise dp or mitm, whichever
+#        has less work in the worst case, and core when neither fits
+#
+# Budgets can also be a list or range like 100,150,200:2000:100, one table
+# line is printed per budget, all from one dp table or one set of meet in the
+# middle tables.
+#
+# --stats writes the nodes or states of the engine, the time spent reading,
+# bounding, on the fringe and building tables, and the peak memory as one JSON
+# line to stderr (see ../searchstats.py); --profile=cprofile or
+# --profile=sample lists the functions the engine spends its time in.
+#
+import os
 import sys
-from queue import PriorityQueue
+from bisect import bisect_right
+import numpy as np
+import core_knapsack
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import searchstats
+
+ENGINES = ("auto", "bnb", "dp", "mitm", "core")
+
+# budgets and rates are floats, sums of the same rates in a different order can differ in the last bits
+EPSILON = 1e-9
+
+# most budget units times robots the dp engine may fill
+DP_CELLS = 10 ** 8
+# most robots the meet in the middle engine lists the teams of
+MITM_ROBOTS = 44
+# inputs small enough for the branch and bound whatever the budget
+BNB_ROBOTS = 12
 
 # Function to read input data having (robot names, skills, and rates)
 def load_people(filename):
@@ -15,92 +57,287 @@ def load_people(filename):
     with open(filename, "r") as file:
         for line in file:
             l = line.split()
-            people[l[0]] = [ float(i) for i in l[1:] ] 
+            people[l[0]] = [ float(i) for i in l[1:] ]
     return people
 
-# Returns team of robots with max skill found amoung explored teams
-def solution_till_now(neg_skill,team,rem_budget,explored_robots,solution):
-    if neg_skill< solution[0]:
-        return (neg_skill,)+((team),)+(rem_budget,explored_robots)
-    else: return solution
-
-#Discards the team if (skill of team + skill of All unexplored robots)
-# less than Skill of solution till now 
-def is_promising_team(new_explored_robots,new_neg_skill,new_rem_budget,sorted_list,solution):
-    rem_skill = 0; rem_budget =new_rem_budget
-    for rem_robots in sorted_list[new_explored_robots:]:
-        if rem_budget-rem_robots[1][1]>=0:
-            rem_skill += rem_robots[1][0]
-            rem_budget -= rem_robots[1][1]
-        else:
-            rem_skill+=(rem_budget/rem_robots[1][1])*rem_robots[1][0]
+# Robots sorted by Skill/Price in decreasing order, as (name, [skill, rate])
+def sorted_robots(people):
+    return sorted(people.items(), key=lambda x: x[1][0]/x[1][1],reverse=True)
+
+#------------Branch and bound--------------------------
+# Skill of the fractional relaxation for the robots from index i on with the
+# remaining budget: whole robots in ratio order while they fit, then the
+# fitting fraction of the next one. The robots that fit are found by binary
+# search on the prefix sums of the rates
+def fractional_bound(i, rem_budget, prefix_rate, prefix_skill, sorted_list):
+    j = bisect_right(prefix_rate, prefix_rate[i] + rem_budget + EPSILON) - 1
+    bound = prefix_skill[j] - prefix_skill[i]
+    if j < len(sorted_list):
+        bound += max(rem_budget - (prefix_rate[j] - prefix_rate[i]), 0) / sorted_list[j][1][1] * sorted_list[j][1][0]
+    return bound
+
+# Nodes are (-(skill + bound), -skill, explored robots, remaining budget, team)
+# where team is a linked list (robot index, rest of team) so children share
+# their parent's team instead of copying it. Nodes expanded and generated are
+# added to stats if given
+def solve_bnb(people, budget, stats=None):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    bound = searchstats.timed(stats, "heuristic", fractional_bound)
+    sorted_list = sorted_robots(people)
+    prefix_rate = [0.0]
+    prefix_skill = [0.0]
+    for (name, (skill, rate)) in sorted_list:
+        prefix_rate.append(prefix_rate[-1] + rate)
+        prefix_skill.append(prefix_skill[-1] + skill)
+
+    (best_skill, best_team) = (0.0, None)
+    fringe = [(-bound(0, budget, prefix_rate, prefix_skill, sorted_list), 0.0, 0, budget, None)]
+    (expanded, generated) = (0, 1)
+    while fringe:
+        (neg_estimate, neg_skill, explored_robots, rem_budget, team) = pop(fringe)
+        if -neg_estimate <= best_skill + EPSILON:
             break
-    if(-rem_skill+new_neg_skill<solution[0]):
-        return True
-    else: False
-    
-# Returns promissing teams with and without adding next robot
-def successors(neg_skill,team,rem_budget,explored_robots,sorted_list,solution):
-    succ=[]
-    for s in [1,0]:
-        if s ==1:
-            new_rem_budget = rem_budget- s * sorted_list[explored_robots][1][1]
-            if new_rem_budget>=0:
-                # subtracting skill of next robot since, we are maintaining -ve of skill
-                new_neg_skill = neg_skill- s *sorted_list[explored_robots][1][0]
-                if len(team)>0:
-                    new_team = team + ((sorted_list[explored_robots][0],s),)
-                else:
-                    new_team = ((sorted_list[explored_robots][0],s),)
-                new_explored_robots = explored_robots+1
-            else:
-                new_rem_budget = rem_budget 
-                new_neg_skill = neg_skill
-                new_team = team 
-                new_explored_robots = explored_robots+1
-        else:
-            #if s=0 i.e creating a team with out that robot
-            #just increments the explored_robots
-            new_rem_budget = rem_budget 
-            new_neg_skill = neg_skill
-            new_team = team 
-            new_explored_robots = explored_robots+1
-        # checking if it is a promissing team to explore further
-        if is_promising_team(new_explored_robots,new_neg_skill,new_rem_budget,sorted_list,solution):
-            succ.append(((new_neg_skill,)+((new_team),)+(new_rem_budget,new_explored_robots)))
-    return succ
-
-
-
-def solve(people,budget):
-    fringe = PriorityQueue()
-    explored_teams = []
-    #Sorting, list of robots based on Skill/Price in Decreasing order
-    sorted_list = sorted(people.items(), key=lambda x: x[1][0]/x[1][1],reverse=True)
-    
-    fringe.put((0,(),budget,0))
-    solution = (0,(),budget,0)
-    
-    while fringe.qsize()>0:
-        (neg_skill,team,rem_budget,explored_robots) = fringe.get()
-        if (explored_robots !=len(sorted_list)) and rem_budget!=0:
-             for succ_team in successors(neg_skill,team,rem_budget,explored_robots,sorted_list,solution):
-                if succ_team not in explored_teams:
-                    fringe.put(succ_team)
-                    explored_teams.append(succ_team)
+        if explored_robots == len(sorted_list):
+            continue
+        expanded += 1
+        (skill, rate) = sorted_list[explored_robots][1]
+        children = [(neg_skill, rem_budget, team)]
+        if rate <= rem_budget + EPSILON:
+            children.append((neg_skill - skill, rem_budget - rate, (explored_robots, team)))
+        for (new_neg_skill, new_rem_budget, new_team) in children:
+            if -new_neg_skill > best_skill:
+                (best_skill, best_team) = (-new_neg_skill, new_team)
+            estimate = -new_neg_skill + bound(explored_robots+1, new_rem_budget, prefix_rate,
+                                              prefix_skill, sorted_list)
+            if estimate > best_skill + EPSILON:
+                generated += 1
+                push(fringe, (-estimate, new_neg_skill, explored_robots+1, new_rem_budget, new_team))
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + expanded
+        stats["generated"] = stats.get("generated", 0) + generated
+
+    indices = []
+    while best_team is not None:
+        (index, best_team) = best_team
+        indices.append(index)
+    return team_of(sorted_list, indices)
+#------------Branch and bound Ended--------------------------
+
+#------------Dynamic program--------------------------
+# smallest power of ten that makes every rate a whole number, None if there is none up to 10^6
+def cost_scale(rates):
+    for digits in range(7):
+        scale = 10 ** digits
+        if all(abs(rate*scale - round(rate*scale)) < 1e-6 for rate in rates):
+            return scale
+    return None
+
+# number of budget units times robots the dp engine would fill, None if the rates cannot be scaled
+def dp_cells(people, budget):
+    scale = cost_scale([rate for (skill, rate) in people.values()])
+    if scale is None:
+        return None
+    return (int(budget*scale + 1e-6) + 1) * len(people)
+
+# best[c] is the most skill of a team costing at most c units; one row of bits
+# per robot records whether taking it improved best[c], to rebuild the team.
+# The table answers every budget up to the one it was built for. Its cells are
+# written to stats if given, one row of them is alive at a time
+def dp_table(sorted_list, budget, stats=None):
+    scale = cost_scale([rate for (name, (skill, rate)) in sorted_list])
+    if scale is None:
+        raise(Exception("Error: rates need at most 6 decimals for the dp engine"))
+    capacity = int(budget*scale + 1e-6)
+    costs = [ int(round(rate*scale)) for (name, (skill, rate)) in sorted_list ]
+
+    best = np.zeros(capacity+1)
+    taken = []
+    for (cost, (name, (skill, rate))) in zip(costs, sorted_list):
+        take = np.zeros(capacity+1, dtype=bool)
+        if cost <= capacity:
+            candidate = best[:capacity+1-cost] + skill
+            take[cost:] = candidate > best[cost:]
+            best[cost:] = np.where(take[cost:], candidate, best[cost:])
+        taken.append(np.packbits(take))
+    if stats is not None:
+        stats["generated"] = len(costs) * (capacity+1)
+        stats["peak_frontier"] = capacity+1
+    return { "scale": scale, "costs": costs, "taken": taken }
+
+def dp_team(sorted_list, table, budget):
+    indices = []
+    units = int(budget*table["scale"] + 1e-6)
+    for i in reversed(range(len(sorted_list))):
+        if (table["taken"][i][units >> 3] >> (7 - (units & 7))) & 1:
+            indices.append(i)
+            units -= table["costs"][i]
+    return team_of(sorted_list, indices)
+
+def solve_dp(people, budget, stats=None):
+    sorted_list = sorted_robots(people)
+    table = searchstats.timed(stats, "table", dp_table)(sorted_list, budget, stats)
+    return dp_team(sorted_list, table, budget)
+#------------Dynamic program Ended--------------------------
+
+#------------Meet in the middle--------------------------
+# cost and skill of every team of some robots; bit k of the index of a team
+# says whether robot k is in it
+def team_sums(robots):
+    costs = np.zeros(1)
+    skills = np.zeros(1)
+    for (name, (skill, rate)) in robots:
+        costs = np.concatenate((costs, costs + rate))
+        skills = np.concatenate((skills, skills + skill))
+    return costs, skills
+
+# the teams of both halves; the second half sorted by cost, with the best
+# skill (and its team) up to each cost. They answer any budget. The teams
+# listed are written to stats if given
+def mitm_tables(sorted_list, stats=None):
+    half = len(sorted_list) // 2
+    (costs_a, skills_a) = team_sums(sorted_list[:half])
+    (costs_b, skills_b) = team_sums(sorted_list[half:])
+    order = np.argsort(costs_b, kind="stable")
+    (costs_b, skills_b) = (costs_b[order], skills_b[order])
+    best_b = np.maximum.accumulate(skills_b)
+    best_at = np.maximum.accumulate(np.where(skills_b == best_b, np.arange(len(skills_b)), 0))
+    if stats is not None:
+        stats["generated"] = len(costs_a) + len(costs_b)
+        stats["peak_frontier"] = len(costs_a) + len(costs_b)
+    return { "half": half, "costs_a": costs_a, "skills_a": skills_a, "costs_b": costs_b, "order": order,
+             "best_b": best_b, "best_at": best_at }
+
+def mitm_team(sorted_list, tables, budget):
+    (half, costs_a, skills_a, costs_b, order, best_b, best_at) = \
+        (tables["half"], tables["costs_a"], tables["skills_a"], tables["costs_b"], tables["order"],
+         tables["best_b"], tables["best_at"])
+    affordable = costs_a <= budget + EPSILON
+    match = np.searchsorted(costs_b, budget - costs_a + EPSILON, side="right") - 1
+    totals = np.where(affordable, skills_a + best_b[np.maximum(match, 0)], -1.0)
+    a = int(np.argmax(totals))
+    b = int(order[best_at[match[a]]])
+    indices = [ k for k in range(half) if (a >> k) & 1 ] + \
+              [ half + k for k in range(len(sorted_list) - half) if (b >> k) & 1 ]
+    return team_of(sorted_list, indices)
+
+def solve_mitm(people, budget, stats=None):
+    sorted_list = sorted_robots(people)
+    tables = searchstats.timed(stats, "table", mitm_tables)(sorted_list, stats)
+    return mitm_team(sorted_list, tables, budget)
+#------------Meet in the middle Ended--------------------------
+
+# the team as (name, fraction) pairs in ratio order, like the output expects
+def team_of(sorted_list, indices):
+    return tuple( (sorted_list[i][0], 1) for i in sorted(indices) )
+
+# The engine with the least work in the worst case: dp fills budget units times
+# robots cells, mitm lists about robots * 2^(robots/2) teams. The branch and
+# bound is usually fastest but can be exponential, so it is only used for small
+# inputs; large pools go to the core engine
+def choose_engine(people, budget):
+    if len(people) <= BNB_ROBOTS:
+        return "bnb"
+    work = {}
+    cells = dp_cells(people, budget)
+    if cells is not None and cells <= DP_CELLS:
+        work["dp"] = cells
+    if len(people) <= MITM_ROBOTS:
+        work["mitm"] = len(people) * 2 ** ((len(people)+1) // 2)
+    if not work:
+        return "core"
+    return min(work, key=work.get)
+
+# the engine that ran is written to stats with its counts if given
+def solve(people, budget, engine="auto", stats=None):
+    if engine == "auto":
+        engine = choose_engine(people, budget)
+    if stats is not None:
+        stats["engine"] = engine
+    if engine == "bnb":
+        return solve_bnb(people, budget, stats)
+    elif engine == "dp":
+        return solve_dp(people, budget, stats)
+    elif engine == "mitm":
+        return solve_mitm(people, budget, stats)
+    elif engine == "core":
+        return core_knapsack.solve(people, budget, stats)
+    raise(Exception("Error: unsupported engine " + engine))
+
+#------------Budget sweep--------------------------
+# budgets from a list and ranges, e.g. 100,150,200:2000:100 (start:stop:step, stop included)
+def parse_budgets(text):
+    budgets = []
+    for part in text.split(","):
+        if ":" in part:
+            (start, stop, step) = [ float(x) for x in part.split(":") ]
+            if step <= 0:
+                raise(Exception("Error: the step of a budget range must be positive"))
+            if stop < start:
+                raise(Exception("Error: budget range " + part + " stops below its start"))
+            k = 0
+            while start + k*step <= stop + EPSILON:
+                budgets.append(round(start + k*step, 10))
+                k += 1
         else:
-            solution = solution_till_now(neg_skill,team,rem_budget,explored_robots,solution)
+            budgets.append(float(part))
+    if not budgets:
+        raise(Exception("Error: no budgets given in " + text))
+    return budgets
 
-    return solution[1:-2][0]
+# The best team for every budget from one computation: the dp table for the
+# largest budget or the meet in the middle tables answer all of them. Only the
+# branch and bound has to run once per budget (stats then add up every run)
+def sweep(people, budgets, engine="auto", stats=None):
+    sorted_list = sorted_robots(people)
+    if engine == "auto":
+        engine = choose_engine(people, max(budgets))
+    if engine == "dp":
+        table = searchstats.timed(stats, "table", dp_table)(sorted_list, max(budgets), stats)
+        return [ (budget, dp_team(sorted_list, table, budget)) for budget in budgets ]
+    elif engine == "mitm":
+        tables = searchstats.timed(stats, "table", mitm_tables)(sorted_list, stats)
+        return [ (budget, mitm_team(sorted_list, tables, budget)) for budget in budgets ]
+    return [ (budget, solve(people, budget, engine, stats)) for budget in budgets ]
+
+def print_sweep(people, results):
+    print("budget people cost skill team")
+    for (budget, solution) in results:
+        print("%f %d %f %f %s" % (budget, len(solution), sum(people[p][1]*f for p,f in solution),
+                                  sum(people[p][0]*f for p,f in solution),
+                                  " ".join(p for p,f in solution) if len(solution)>0 else "Inf"))
+#------------Budget sweep Ended--------------------------
 
 if __name__ == "__main__":
 
-    if(len(sys.argv) != 3):
+    if(len(sys.argv) < 3):
         raise Exception('Error: expected 2 command line arguments')
 
+    engine = "auto"
+    (stats, profiler, options) = searchstats.parse_options(sys.argv[3:])
+    for option in options:
+        if option.startswith("--engine=") and option[len("--engine="):] in ENGINES:
+            engine = option[len("--engine="):]
+        else:
+            raise Exception('Error: unsupported option ' + option)
+
+    with searchstats.phase(stats, "parse"):
+        if engine == "core":
+            # streamed into columns, without a list per robot
+            people = core_knapsack.ColumnPeople(core_knapsack.load_columns(sys.argv[1]))
+        else:
+            people = load_people(sys.argv[1])
+    if "," in sys.argv[2] or ":" in sys.argv[2]:
+        # a list or range of budgets, one line of the table per budget
+        with searchstats.phase(stats, "search"):
+            results = searchstats.profiled(profiler, sweep, people, parse_budgets(sys.argv[2]), engine, stats)
+        print_sweep(people, results)
+        if stats is not None:
+            searchstats.report(stats)
+        sys.exit(0)
+
     budget = float(sys.argv[2])
-    people = load_people(sys.argv[1])
-    solution = solve(people, budget)
+    with searchstats.phase(stats, "search"):
+        solution = searchstats.profiled(profiler, solve, people, budget, engine, stats)
     if len(solution)>0:
         print("Found a group with %d people costing %f with total skill %f" % \
                    ( len(solution), sum(people[p][1]*f for p,f in solution), sum(people[p][0]*f for p,f in solution)))
@@ -108,6 +345,7 @@ if __name__ == "__main__":
             print("%s %f" % s)
     else:
         print("Inf")
-        
+    if stats is not None:
+        searchstats.report(stats)
 
 
@@ -0,0 +1,232 @@
+#!/usr/local/bin/python3
+#
+# core_knapsack.py : Team choice for very large pools of robots
+#
+# The robots file is streamed in chunks into numpy columns (name id, skill,
+# rate) instead of a dict of lists. When a name appears more than once the
+# last line wins, like load_people.
+#
+# In ratio order, the greedy team takes every robot up to the break robot,
+# the first one that no longer fits. Robots far from the break robot are
+# almost always fixed: the ones before it are in the best team and the ones
+# after it are not. The core algorithm:
+#   1. fixes every robot outside a small core around the break robot
+#   2. solves the core exactly with a dynamic program over (cost, skill)
+#      states, one vectorized update per robot that merges the states with
+#      and without it and drops dominated and hopeless states
+#   3. proves the fixing with the Dembo-Hammer bound: flipping robot j away
+#      from its greedy choice gives at most LP - |skill_j - rate_j * r| skill,
+#      where LP is the fractional optimum and r the break robot's ratio. Every
+#      robot whose bound beats the core solution joins the core and the core
+#      is solved again, until no robot outside it could improve the team
+# The team is then optimal. Loading keeps every name and two floats per
+# robot, without the per-line lists of load_people, and the search only holds
+# the states of the core on top of that.
+#
+# Usage: ./core_knapsack.py robots-file budget [--stats] [--profile=cprofile|sample]
+#
+import os
+import sys
+from collections.abc import Mapping
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import searchstats
+
+# budgets and rates are floats, sums of the same rates in a different order can differ in the last bits
+EPSILON = 1e-9
+# lines parsed per chunk while loading
+CHUNK_LINES = 1 << 16
+# robots on each side of the break robot in the first core
+CORE_RADIUS = 25
+
+# Stream a robots file into columns; name_id indexes names, robots keep the
+# order of the first line of their name like the dict of load_people, so robot
+# i is the one named names[i] and ids maps a name to its robot
+def load_columns(filename):
+    ids = {}
+    names = []
+    chunks = []
+    with open(filename, "r") as file:
+        while True:
+            lines = [ line.split() for (n, line) in zip(range(CHUNK_LINES), file) ]
+            if not lines:
+                break
+            name_id = np.empty(len(lines), dtype=np.int64)
+            values = np.empty((len(lines), 2))
+            for (i, l) in enumerate(lines):
+                if l[0] not in ids:
+                    ids[l[0]] = len(names)
+                    names.append(l[0])
+                name_id[i] = ids[l[0]]
+                values[i] = (float(l[1]), float(l[2]))
+            chunks.append((name_id, values))
+    if not chunks:
+        return { "names": names, "ids": ids, "name_id": np.empty(0, dtype=np.int64), "skill": np.empty(0),
+                 "rate": np.empty(0) }
+
+    name_id = np.concatenate([ c[0] for c in chunks ])
+    values = np.concatenate([ c[1] for c in chunks ])
+    # the last line of every name, in the order of the names
+    last = np.zeros(len(names), dtype=np.int64)
+    last[name_id] = np.arange(len(name_id))
+    return { "names": names, "ids": ids, "name_id": name_id[last], "skill": values[last, 0],
+             "rate": values[last, 1] }
+
+# Read-only view of columns as the dict of load_people (name -> [skill, rate]),
+# so choose_team can print and sweep a pool loaded by load_columns
+class ColumnPeople(Mapping):
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __getitem__(self, name):
+        i = self.columns["ids"][name]
+        return [ float(self.columns["skill"][i]), float(self.columns["rate"][i]) ]
+
+    def __iter__(self):
+        return iter(self.columns["names"])
+
+    def __len__(self):
+        return len(self.columns["names"])
+
+# the same columns for a dict of load_people
+def columns_of(people):
+    if isinstance(people, ColumnPeople):
+        return people.columns
+    names = list(people)
+    values = np.array([ people[name] for name in names ]).reshape(-1, 2)
+    return { "names": names, "name_id": np.arange(len(names)), "skill": values[:, 0], "rate": values[:, 1] }
+
+# tolerance of a comparison with a float sum of about this size
+def tolerance(magnitude):
+    return EPSILON * max(1.0, abs(magnitude))
+
+# Exact dynamic program over the core robots (in ratio order) for the given
+# capacity. States are (cost, skill) pairs with skill rising with cost; each
+# robot merges the states with and without it, keeps the non-dominated ones
+# and drops those whose fractional bound cannot reach the lower bound. The
+# state of the greedy team is always kept, so the result is never worse than
+# it whatever the rounding. Returns the best skill and the core robots of its
+# team. States kept are added to stats if given, with the most kept after one
+# robot as the peak
+def solve_core(skill, rate, core, capacity, lower_bound, stats=None):
+    (costs, skills, greedy) = (np.zeros(1), np.zeros(1), np.ones(1, dtype=bool))
+    greedy_cost = 0.0
+    rows = []
+    for (t, j) in enumerate(core):
+        (new_costs, new_skills) = (costs + rate[j], skills + skill[j])
+        fits = new_costs <= capacity + EPSILON
+        # the greedy team takes the robot when it fits, with the same sums as its state
+        takes = greedy_cost + rate[j] <= capacity + EPSILON
+        if takes:
+            greedy_cost += rate[j]
+        costs = np.concatenate((costs, new_costs[fits]))
+        skills = np.concatenate((skills, new_skills[fits]))
+        greedy = np.concatenate((greedy & (not takes), greedy[fits] & takes))
+        parent = np.concatenate((np.arange(len(fits)), np.nonzero(fits)[0]))
+        took = np.concatenate((np.zeros(len(fits), dtype=bool), np.ones(int(fits.sum()), dtype=bool)))
+
+        # by cost, the most skill first; a state is kept if it has more skill than every cheaper one
+        order = np.lexsort((-skills, costs))
+        (costs, skills, greedy, parent, took) = (costs[order], skills[order], greedy[order], parent[order], took[order])
+        keep = np.ones(len(skills), dtype=bool)
+        keep[1:] = skills[1:] > np.maximum.accumulate(skills)[:-1]
+        # the robots left are no better than the next one in ratio order
+        next_ratio = skill[core[t+1]] / rate[core[t+1]] if t+1 < len(core) else 0.0
+        keep &= skills + (capacity - costs) * next_ratio >= lower_bound - tolerance(lower_bound)
+        keep |= greedy
+        (costs, skills, greedy, parent, took) = (costs[keep], skills[keep], greedy[keep], parent[keep], took[keep])
+        rows.append((parent, took))
+    if stats is not None:
+        stats["generated"] = stats.get("generated", 0) + sum(len(parent) for (parent, took) in rows)
+        searchstats.peak(stats, "peak_frontier", max([ len(parent) for (parent, took) in rows ], default=1))
+
+    if len(skills) == 0:
+        return 0.0, []
+    state = int(np.argmax(skills))
+    best = skills[state]
+    team = []
+    for t in reversed(range(len(core))):
+        (parent, took) = rows[t]
+        if took[state]:
+            team.append(core[t])
+        state = parent[state]
+    return best, team
+
+# greedy skill of the core robots in ratio order, a lower bound for solve_core
+def greedy_skill(skill, rate, core, capacity):
+    total = 0.0
+    for j in core:
+        if rate[j] <= capacity + EPSILON:
+            capacity -= rate[j]
+            total += skill[j]
+    return total
+
+# Indices (into the columns) of an optimal team and the number of core robots.
+# Every core solved is counted in stats if given
+def solve_columns(columns, budget, stats=None):
+    with np.errstate(divide="ignore"):
+        ratio = columns["skill"] / columns["rate"]
+    order = np.argsort(-ratio, kind="stable")
+    (skill, rate) = (columns["skill"][order], columns["rate"][order])
+    n = len(order)
+    prefix_rate = np.concatenate(([0.0], np.cumsum(rate)))
+    prefix_skill = np.concatenate(([0.0], np.cumsum(skill)))
+    # the break robot, the first one that does not fit after the ones before it
+    b = int(np.searchsorted(prefix_rate[1:], budget + EPSILON, side="right"))
+    if b == n:
+        return order, 0
+
+    break_ratio = skill[b] / rate[b]
+    lp = prefix_skill[b] + (budget - prefix_rate[b]) * break_ratio
+    # Dembo-Hammer bound of every robot on the best team that differs from the greedy choice for it
+    flip_bound = lp - np.abs(skill - rate * break_ratio)
+
+    in_core = np.zeros(n, dtype=bool)
+    in_core[max(0, b - CORE_RADIUS):min(n, b + CORE_RADIUS)] = True
+    lower_bound = prefix_skill[b]
+    while True:
+        core = np.nonzero(in_core)[0]
+        fixed = np.nonzero(~in_core[:b])[0]
+        capacity = budget - rate[fixed].sum()
+        base = skill[fixed].sum()
+        lower_bound = max(lower_bound, base + greedy_skill(skill, rate, core, capacity))
+        # lower_bound - base loses the last bits of the larger of the two
+        (best, team) = solve_core(skill, rate, core, capacity, lower_bound - base - tolerance(lower_bound), stats)
+        if stats is not None:
+            stats["expanded"] = stats.get("expanded", 0) + len(core)
+        lower_bound = max(lower_bound, base + best)
+        unproven = ~in_core & (flip_bound > lower_bound + tolerance(lower_bound))
+        if not unproven.any():
+            break
+        in_core |= unproven
+    return order[np.sort(np.concatenate((fixed, np.array(team, dtype=np.int64))))], len(core)
+
+# the team as (name, fraction) pairs in ratio order, like choose_team.solve
+def solve(people, budget, stats=None):
+    columns = columns_of(people)
+    (team, core_size) = solve_columns(columns, budget, stats)
+    if stats is not None:
+        stats["core"] = core_size
+    return tuple( (columns["names"][columns["name_id"][i]], 1) for i in team )
+
+if __name__ == "__main__":
+
+    (stats, profiler, arguments) = searchstats.parse_options(sys.argv[1:])
+    if(len(arguments) != 2):
+        raise Exception('Error: expected 2 command line arguments')
+
+    budget = float(arguments[1])
+    with searchstats.phase(stats, "parse"):
+        columns = load_columns(arguments[0])
+    with searchstats.phase(stats, "search"):
+        (team, core_size) = searchstats.profiled(profiler, solve_columns, columns, budget, stats)
+    if len(team)>0:
+        print("Found a group with %d people costing %f with total skill %f" % \
+                   ( len(team), columns["rate"][team].sum(), columns["skill"][team].sum()))
+        for i in team:
+            print("%s %f" % (columns["names"][columns["name_id"][i]], 1))
+    else:
+        print("Inf")
+    if stats is not None:
+        stats["core"] = core_size
+        searchstats.report(stats)
@@ -0,0 +1,313 @@
+#!/usr/local/bin/python3
+# contraction.py : Contraction hierarchies for route.py
+#
+# Preprocessing contracts the cities one at a time, least important first.
+# Contracting a city removes it from the graph; for every pair of its
+# remaining neighbours whose cheapest route runs through it, a shortcut road
+# with the cost of that route is added, unless a local witness search finds
+# a route that is at least as cheap without it. The order of contraction is
+# the rank of a city. A query is then two Dijkstra searches, from the start
+# and from the destination, that only follow roads up to cities of higher
+# rank. Both reach the highest-ranked city of the cheapest route, and only a
+# few hundred cities are settled instead of thousands.
+#
+# Roads are compared by the same labels as route.solve, (cost, miles, hours,
+# gallons) in that order, so ties are settled the same way. A shortcut
+# remembers the two roads it replaces; the route found is unpacked back to
+# the roads of road-segments.txt, and its totals are added up along them in
+# route order, as route.solve does.
+#
+# There is one hierarchy per cost function, all in one file with the layout of
+# the graph index (graph_index.write_columns), rebuilt when it does not match
+# the graph index's source files.
+#
+# Usage: ./contraction.py [segments,distance,time,mpg]
+#
+import array
+import heapq
+import os
+import sys
+import graph_index
+import landmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import searchstats
+
+MAGIC = b"RGCH"
+FORMAT_VERSION = 1
+CONTRACTION_FILE = "road-segments.ch"
+METRICS = landmarks.METRICS
+
+# cities a witness search may settle before it gives up and keeps the shortcut
+WITNESS_LIMIT = 60
+
+ZERO = (0, 0, 0, 0)
+
+
+def add(label1, label2):
+    return (label1[0] + label2[0], label1[1] + label2[1], label1[2] + label2[2], label1[3] + label2[3])
+
+
+# (cost, miles, hours, gallons) of every road for a cost function
+def edge_labels(graph, metric):
+    costs = landmarks.edge_costs(graph, metric)
+    return [(costs[edge], int(graph["length"][edge]), graph["hours"][edge], graph["gas"][edge])
+            for edge in range(len(graph["targets"]))]
+
+
+#------------Building--------------------------
+# Cheapest known routes from source that avoid one city, settling at most
+# WITNESS_LIMIT cities and none beyond limit. Costs that are not final are
+# still the costs of real routes, so they are valid witnesses too
+def witness_search(neighbours, source, excluded, limit):
+    cost = { source: ZERO }
+    settled = set()
+    fringe = [(ZERO, source)]
+    while fringe and len(settled) < WITNESS_LIMIT:
+        (label, city) = heapq.heappop(fringe)
+        if city in settled:
+            continue
+        if label > limit:
+            break
+        settled.add(city)
+        for (next_city, (road_label, arc)) in neighbours[city].items():
+            if next_city != excluded:
+                new_label = add(label, road_label)
+                if next_city not in cost or new_label < cost[next_city]:
+                    cost[next_city] = new_label
+                    heapq.heappush(fringe, (new_label, next_city))
+    return cost
+
+
+# shortcuts (u, w, label, arc u-city, arc city-w) needed to contract a city
+def shortcuts_for(neighbours, city):
+    roads = sorted(neighbours[city].items())
+    shortcuts = []
+    for (i, (u, (label_u, arc_u))) in enumerate(roads):
+        if i + 1 < len(roads):
+            limit = max(add(label_u, label_w) for (w, (label_w, arc_w)) in roads[i + 1:])
+            cost = witness_search(neighbours, u, city, limit)
+            for (w, (label_w, arc_w)) in roads[i + 1:]:
+                label = add(label_u, label_w)
+                if w not in cost or label < cost[w]:
+                    shortcuts.append((u, w, label, arc_u, arc_w))
+    return shortcuts
+
+
+# importance of a city: shortcuts added minus roads removed, plus the number of
+# contracted neighbours so the contraction spreads evenly over the map
+def priority(neighbours, depth, city):
+    return len(shortcuts_for(neighbours, city)) - len(neighbours[city]) + depth[city]
+
+
+def build_hierarchy(graph, metric):
+    n = len(graph["names"])
+    labels = edge_labels(graph, metric)
+    # arc i joins arc_u[i] and arc_v[i], either a road (arc_edge) or a shortcut
+    # over the arcs arc_first and arc_second
+    arcs = { "u": [], "v": [], "edge": [], "first": [], "second": [], "label": [] }
+
+    def add_arc(u, v, label, edge, first, second):
+        for (key, value) in (("u", u), ("v", v), ("edge", edge), ("first", first), ("second", second),
+                             ("label", label)):
+            arcs[key].append(value)
+        neighbours[u][v] = neighbours[v][u] = (label, len(arcs["u"]) - 1)
+
+    # the cheapest road between each pair of cities
+    cheapest = {}
+    for city in range(n):
+        for edge in graph_index.edges(graph, city):
+            pair = (min(city, graph["targets"][edge]), max(city, graph["targets"][edge]))
+            if pair[0] != pair[1] and (pair not in cheapest or labels[edge] < labels[cheapest[pair]]):
+                cheapest[pair] = edge
+    neighbours = [{} for city in range(n)]
+    for ((u, v), edge) in sorted(cheapest.items()):
+        add_arc(u, v, labels[edge], edge, -1, -1)
+
+    depth = [0] * n
+    queue = [(priority(neighbours, depth, city), city) for city in range(n)]
+    heapq.heapify(queue)
+    rank = [0] * n
+    order = 0
+    while queue:
+        (old, city) = heapq.heappop(queue)
+        # priorities are updated lazily, contract only if it is still the least important
+        new = priority(neighbours, depth, city)
+        if queue and new > queue[0][0]:
+            heapq.heappush(queue, (new, city))
+            continue
+        for (u, w, label, arc_u, arc_w) in shortcuts_for(neighbours, city):
+            add_arc(u, w, label, -1, arc_u, arc_w)
+        for u in neighbours[city]:
+            del neighbours[u][city]
+            depth[u] = max(depth[u], depth[city] + 1)
+        neighbours[city] = {}
+        rank[city] = order
+        order += 1
+
+    # arcs go up from their lower-ranked city; the cities are laid out CSR style
+    up = [[] for city in range(n)]
+    for arc in range(len(arcs["u"])):
+        (u, v) = (arcs["u"][arc], arcs["v"][arc])
+        up[u if rank[u] < rank[v] else v].append(arc)
+    offsets = array.array("q", [0] * (n + 1))
+    for city in range(n):
+        offsets[city + 1] = offsets[city] + len(up[city])
+
+    columns = { "rank": array.array("i", rank), "up_offsets": offsets,
+                "up_arcs": array.array("i", [arc for city in range(n) for arc in up[city]]) }
+    for key in ("u", "v", "edge", "first", "second"):
+        columns["arc_" + key] = array.array("i", arcs[key])
+    for (i, key) in enumerate(("cost", "miles", "hours", "gas")):
+        columns["arc_" + key] = array.array("d", [label[i] for label in arcs["label"]])
+    return columns
+
+
+def build(graph, metrics, path):
+    columns = {}
+    for metric in metrics:
+        for (name, column) in build_hierarchy(graph, metric).items():
+            columns[metric + "." + name] = column
+    graph_index.write_columns(path, MAGIC, { "version": FORMAT_VERSION, "sources": graph["sources"],
+                                             "metrics": list(metrics) }, columns)
+#------------Building Ended--------------------------
+
+
+#------------Query--------------------------
+# Memory-map the hierarchies of a graph, None if there is no file or it was
+# built for other source files
+def load(graph, path):
+    mapped = graph_index.map_columns(path, MAGIC)
+    if mapped is None:
+        return None
+    (header, columns) = mapped
+    if header["version"] != FORMAT_VERSION or header["sources"] != graph["sources"]:
+        return None
+    hierarchies = {}
+    for metric in header["metrics"]:
+        hierarchies[metric] = { name[len(metric) + 1:]: column for (name, column) in columns.items()
+                                if name.startswith(metric + ".") }
+    return hierarchies
+
+
+# The hierarchies for a graph, built and saved when the file is missing or stale
+def load_or_build(graph, path):
+    hierarchies = load(graph, path)
+    if hierarchies is None or any(metric not in hierarchies for metric in METRICS):
+        build(graph, METRICS, path)
+        hierarchies = load(graph, path)
+    return hierarchies
+
+
+def contraction_path(segments_path="road-segments.txt"):
+    return os.path.join(os.path.dirname(os.path.abspath(segments_path)), CONTRACTION_FILE)
+
+
+def arc_label(hierarchy, arc):
+    return (hierarchy["arc_cost"][arc], hierarchy["arc_miles"][arc], hierarchy["arc_hours"][arc],
+            hierarchy["arc_gas"][arc])
+
+
+# Dijkstra over the upward arcs only, the label and arc reaching every settled city.
+# Settled and reached cities are added to stats if given
+def upward_search(hierarchy, start, stats=None):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    best = { start: (ZERO, -1) }
+    settled = set()
+    fringe = [(ZERO, start)]
+    while fringe:
+        (label, city) = pop(fringe)
+        if city in settled:
+            continue
+        settled.add(city)
+        for i in range(hierarchy["up_offsets"][city], hierarchy["up_offsets"][city + 1]):
+            arc = hierarchy["up_arcs"][i]
+            next_city = hierarchy["arc_u"][arc] + hierarchy["arc_v"][arc] - city
+            new_label = add(label, arc_label(hierarchy, arc))
+            if next_city not in best or new_label < best[next_city][0]:
+                best[next_city] = (new_label, arc)
+                push(fringe, (new_label, next_city))
+    if stats is not None:
+        stats["expanded"] = stats.get("expanded", 0) + len(settled)
+        stats["generated"] = stats.get("generated", 0) + len(best)
+        stats["peak_closed"] = stats.get("peak_closed", 0) + len(settled)
+    return best
+
+
+# the roads of an arc walked from one of its cities, as (road, next city) pairs.
+# Shortcuts nest deeply on long routes, so they are unpacked with a stack
+def unpack(hierarchy, arc, city):
+    roads = []
+    stack = [(arc, city)]
+    while stack:
+        (arc, city) = stack.pop()
+        if hierarchy["arc_edge"][arc] >= 0:
+            roads.append((hierarchy["arc_edge"][arc], hierarchy["arc_u"][arc] + hierarchy["arc_v"][arc] - city))
+            continue
+        (first, second) = (hierarchy["arc_first"][arc], hierarchy["arc_second"][arc])
+        if city not in (hierarchy["arc_u"][first], hierarchy["arc_v"][first]):
+            (first, second) = (second, first)
+        middle = hierarchy["arc_u"][first] + hierarchy["arc_v"][first] - city
+        stack.append((second, middle))
+        stack.append((first, city))
+    return roads
+
+
+# arcs from a city back down to the start of an upward search
+def arcs_to(hierarchy, best, city):
+    arcs = []
+    while best[city][1] != -1:
+        arc = best[city][1]
+        arcs.append(arc)
+        city = hierarchy["arc_u"][arc] + hierarchy["arc_v"][arc] - city
+    return arcs
+
+
+# The roads of the cheapest route between two city ids as (road, next city)
+# pairs, None when there is no route
+def route_roads(hierarchy, start_city, destination_city, stats=None):
+    forward = upward_search(hierarchy, start_city, stats)
+    backward = upward_search(hierarchy, destination_city, stats)
+    meeting = [(add(forward[city][0], backward[city][0]), city) for city in forward if city in backward]
+    if not meeting:
+        return None
+    middle = min(meeting)[1]
+    roads = []
+    city = start_city
+    for arc in reversed(arcs_to(hierarchy, forward, middle)):
+        roads += unpack(hierarchy, arc, city)
+        city = roads[-1][1]
+    for arc in arcs_to(hierarchy, backward, middle):
+        roads += unpack(hierarchy, arc, city)
+        city = roads[-1][1]
+    return roads
+
+
+# total_miles, total_hours, total_gas_gallons, path like route.solve, and the
+# highway of every road on the route. Counts of both upward searches go to stats if given
+def solve(graph, hierarchies, start_city, destination_city, variant, stats=None):
+    if start_city == destination_city:
+        return ('', '', '', []), []
+    if start_city not in graph["ids"] or destination_city not in graph["ids"]:
+        return (int(0), float(0), float(0), []), []
+    (start_city, destination_city) = (graph["ids"][start_city], graph["ids"][destination_city])
+    roads = route_roads(hierarchies[variant], start_city, destination_city, stats)
+    if roads is None:
+        return (int(0), float(0), float(0), []), []
+    (total_miles, total_hours, total_gas_gallons) = (0, 0, 0)
+    for (edge, city) in roads:
+        (total_miles, total_hours, total_gas_gallons) = (total_miles + int(graph["length"][edge]),
+                                                         float(total_hours) + graph["hours"][edge],
+                                                         float(total_gas_gallons) + graph["gas"][edge])
+    path = [graph["names"][start_city]] + [graph["names"][city] for (edge, city) in roads]
+    return (total_miles, total_hours, total_gas_gallons, path), \
+           [graph["highways"][graph["highway"][edge]] for (edge, city) in roads]
+#------------Query Ended--------------------------
+
+
+if __name__ == "__main__":
+    metrics = sys.argv[1].split(",") if len(sys.argv) > 1 else list(METRICS)
+    if any(metric not in METRICS for metric in metrics):
+        raise(Exception("Error: unsupported cost function, expected " + ",".join(METRICS)))
+    graph = graph_index.load("road-segments.txt", "city-gps.txt")
+    build(graph, metrics, contraction_path())
+    print("Wrote " + contraction_path())
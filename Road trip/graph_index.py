@@ -0,0 +1,204 @@
+#!/usr/local/bin/python3
+# graph_index.py : Compiled binary index of the road network for route.py
+#
+# Parsing road-segments.txt and city-gps.txt on every query is most of the
+# cost of a short route, and the parsed dictionaries keep lengths and speeds
+# as strings that are converted again on every edge. This module compiles
+# both files once into a binary index:
+#
+# - city names are interned to integer ids 0..n-1
+# - the roads of city i are edges offsets[i] .. offsets[i+1]-1 (CSR layout),
+#   each road stored in both directions, in the order of the text file
+# - per edge: target city, length (miles), speed limit, hours, gallons and
+#   the highway name id, all numeric
+# - per city: latitude and longitude (NaN when the city has no GPS entry)
+#
+# File layout: magic, header length, a JSON header (format version, the size
+# and mtime of the source files, names, column offsets and types) and then
+# the columns, 8-byte aligned. The file is memory-mapped and the columns are
+# read through typed memoryviews, so loading costs no parsing or copying.
+# The index is rebuilt automatically when a source file changes.
+#
+# Usage: ./graph_index.py [road-segments.txt] [city-gps.txt]
+#
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+from math import pow
+
+MAGIC = b"RGIX"
+FORMAT_VERSION = 1
+INDEX_FILE = "road-segments.idx"
+
+
+# MPG(v)=(8*v(1 − v/150)^4)/3
+def mpg(speed_limit):
+    return pow(1 - float(speed_limit) / 150, 4) * float(speed_limit) * 8 / 3
+
+
+def calculate_gas_consumption(road_length, speed_limit):
+    return road_length / mpg(speed_limit)
+
+
+def source_stamp(path):
+    info = os.stat(path)
+    return [info.st_size, info.st_mtime_ns]
+
+
+# Parse the text files into the header fields and columns of an index
+def compile_graph(segments_path, gps_path):
+    ids = {}
+    names = []
+    highway_ids = {}
+    highways = []
+    edges = []
+
+    def city_id(name):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    with open(segments_path, 'r') as file:
+        for line in file:
+            elements = line.split()
+            # first city, second city, length (in miles), speed limit (in miles per hour), name of highway
+            if len(elements) == 5:
+                (a, b) = (city_id(elements[0]), city_id(elements[1]))
+                if elements[4] not in highway_ids:
+                    highway_ids[elements[4]] = len(highways)
+                    highways.append(elements[4])
+                edges.append((a, b, float(elements[2]), float(elements[3]), highway_ids[elements[4]]))
+                edges.append((b, a, float(elements[2]), float(elements[3]), highway_ids[elements[4]]))
+
+    latitude = array.array("d", [float("nan")] * len(names))
+    longitude = array.array("d", [float("nan")] * len(names))
+    with open(gps_path, 'r') as file:
+        for line in file:
+            elements = line.split()
+            if len(elements) == 3 and elements[0] in ids:
+                latitude[ids[elements[0]]] = float(elements[1])
+                longitude[ids[elements[0]]] = float(elements[2])
+
+    # stable sort by source keeps each city's roads in file order
+    edges.sort(key=lambda edge: edge[0])
+    offsets = array.array("q", [0] * (len(names) + 1))
+    for edge in edges:
+        offsets[edge[0] + 1] += 1
+    for i in range(len(names)):
+        offsets[i + 1] += offsets[i]
+
+    columns = {
+        "offsets": offsets, "latitude": latitude, "longitude": longitude,
+        "targets": array.array("i", [edge[1] for edge in edges]),
+        "length": array.array("d", [edge[2] for edge in edges]),
+        "speed": array.array("d", [edge[3] for edge in edges]),
+        "hours": array.array("d", [edge[2] / edge[3] for edge in edges]),
+        "gas": array.array("d", [calculate_gas_consumption(edge[2], edge[3]) for edge in edges]),
+        "highway": array.array("i", [edge[4] for edge in edges]),
+    }
+    header = {
+        "version": FORMAT_VERSION,
+        "sources": { "segments": source_stamp(segments_path), "gps": source_stamp(gps_path) },
+        "names": names, "highways": highways,
+        "max_speed": max(columns["speed"], default=0.0),
+        "max_mpg": max((mpg(speed) for speed in columns["speed"]), default=0.0),
+        "max_segment_length": max(columns["length"], default=0.0),
+    }
+    return header, columns
+
+
+# Write a header and typed columns: magic, header length, the JSON header with
+# the offset, type and length of every column, then the columns, 8-byte aligned.
+# Shared by the other compiled files of route.py (landmarks, contraction)
+def write_columns(path, magic, header, columns):
+    header = dict(header, columns={})
+    offset = 0
+    for (name, column) in columns.items():
+        header["columns"][name] = [offset, column.typecode, len(column)]
+        offset += (len(column) * column.itemsize + 7) // 8 * 8
+    data = json.dumps(header).encode()
+    start = (8 + len(data) + 7) // 8 * 8
+    # write to a temporary file first so a concurrent reader never sees half a file
+    with open(path + ".tmp", "wb") as file:
+        file.write(magic + struct.pack("<I", len(data)) + data)
+        file.write(b"\0" * (start - 8 - len(data)))
+        for column in columns.values():
+            file.write(column.tobytes())
+            file.write(b"\0" * ((-len(column) * column.itemsize) % 8))
+    os.replace(path + ".tmp", path)
+
+
+# Memory-map a file of write_columns, the header and the columns as typed
+# memoryviews, None if it is missing or not of this magic
+def map_columns(path, magic):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:4] != magic:
+        return None
+    length = struct.unpack("<I", data[4:8])[0]
+    header = json.loads(data[8:8 + length].decode())
+    start = (8 + length + 7) // 8 * 8
+    view = memoryview(data)
+    columns = {}
+    for (name, (offset, typecode, count)) in header.pop("columns").items():
+        size = struct.calcsize(typecode)
+        columns[name] = view[start + offset:start + offset + count * size].cast(typecode)
+    return header, columns
+
+
+def write_index(path, header, columns):
+    write_columns(path, MAGIC, header, columns)
+
+
+# Memory-map an index, None if it is missing, from another format version or
+# older than its source files
+def read_index(path, segments_path, gps_path):
+    mapped = map_columns(path, MAGIC)
+    if mapped is None:
+        return None
+    (header, columns) = mapped
+    if header["version"] != FORMAT_VERSION or header["sources"] != \
+            { "segments": source_stamp(segments_path), "gps": source_stamp(gps_path) }:
+        return None
+    return make_graph(header, columns)
+
+
+def make_graph(header, columns):
+    graph = dict(header, **columns)
+    graph["ids"] = { name: i for (i, name) in enumerate(graph["names"]) }
+    return graph
+
+
+# The graph for the given text files, from the index next to them when it is
+# up to date, otherwise compiled again (and the index rewritten if possible)
+def load(segments_path="road-segments.txt", gps_path="city-gps.txt", index_path=None):
+    index_path = index_path or os.path.join(os.path.dirname(os.path.abspath(segments_path)), INDEX_FILE)
+    graph = read_index(index_path, segments_path, gps_path)
+    if graph is None:
+        (header, columns) = compile_graph(segments_path, gps_path)
+        try:
+            write_index(index_path, header, columns)
+        except OSError:
+            return make_graph(header, columns)
+        graph = read_index(index_path, segments_path, gps_path)
+    return graph
+
+
+# roads leaving a city as edge ids
+def edges(graph, city):
+    return range(graph["offsets"][city], graph["offsets"][city + 1])
+
+
+if __name__ == "__main__":
+    segments_path = sys.argv[1] if len(sys.argv) > 1 else "road-segments.txt"
+    gps_path = sys.argv[2] if len(sys.argv) > 2 else "city-gps.txt"
+    (header, columns) = compile_graph(segments_path, gps_path)
+    index_path = os.path.join(os.path.dirname(os.path.abspath(segments_path)), INDEX_FILE)
+    write_index(index_path, header, columns)
+    print("Indexed %d cities and %d roads into %s" % (len(header["names"]), len(columns["targets"]) // 2, index_path))
@@ -0,0 +1,147 @@
+#!/usr/local/bin/python3
+# landmarks.py : Landmark (ALT) lower bounds for route.py
+#
+# The GPS heuristics of route.py are straight-line distances in degrees, far
+# below the real cost of a route, and 0 for every city missing from
+# city-gps.txt. This module picks k landmark cities and stores the exact cost
+# from every landmark to every city for each cost function. Roads go both
+# ways, so the cost to a landmark is the same as the cost from it, and by the
+# triangle inequality
+#   cost(v, t) >= |cost(L, t) - cost(L, v)|
+# for every landmark L. The largest of these bounds is admissible and
+# consistent, with or without GPS data.
+#
+# Landmarks are chosen farthest-first by road miles: each new landmark is the
+# city whose distance to the nearest chosen landmark is largest, which puts
+# them on the edges of the map where the bounds are tightest.
+#
+# The file has the layout of the graph index (graph_index.write_columns): a
+# JSON header with the format version, the graph index's source stamps and the
+# landmarks, then one column of doubles per cost function, k values per city,
+# -1 for unreachable cities. It is memory-mapped and read in place.
+#
+# Usage: ./landmarks.py [k]
+#
+import array
+import heapq
+import os
+import sys
+import graph_index
+
+MAGIC = b"RLMK"
+FORMAT_VERSION = 2
+LANDMARK_FILE = "road-segments.lmk"
+DEFAULT_LANDMARKS = 16
+METRICS = ("segments", "distance", "time", "mpg")
+
+# floating point sums of the same route can differ in the last bits, keep
+# bounds of the float metrics just below the exact difference so they never
+# overestimate. Segments and miles are sums of integers and need no slack
+SLACK = 1e-9
+EXACT_METRICS = ("segments", "distance")
+
+
+# cost of every edge for a cost function, as route.py adds them up
+def edge_costs(graph, metric):
+    if metric == 'segments':
+        return [1] * len(graph["targets"])
+    elif metric == 'distance':
+        return [int(length) for length in graph["length"]]
+    elif metric == 'time':
+        return graph["hours"]
+    elif metric == 'mpg':
+        return graph["gas"]
+
+
+# One-to-all Dijkstra, the cost of every city from start, -1 if unreachable
+def costs_from(graph, costs, start):
+    cost = [-1] * len(graph["names"])
+    visited = set()
+    fringe = [(0, start)]
+    while fringe:
+        (total, city) = heapq.heappop(fringe)
+        if city in visited:
+            continue
+        visited.add(city)
+        cost[city] = total
+        for edge in graph_index.edges(graph, city):
+            if graph["targets"][edge] not in visited:
+                heapq.heappush(fringe, (total + costs[edge], graph["targets"][edge]))
+    return cost
+
+
+# farthest-first landmarks by road miles, with the distance trees they needed.
+# The first landmark is the city farthest from the first city of the file
+def choose_landmarks(graph, k):
+    costs = edge_costs(graph, 'distance')
+    nearest = costs_from(graph, costs, 0)
+    chosen = []
+    trees = []
+    while len(chosen) < k:
+        landmark = max(range(len(nearest)), key=lambda city: nearest[city])
+        if nearest[landmark] <= 0:
+            break
+        chosen.append(landmark)
+        trees.append(costs_from(graph, costs, landmark))
+        if len(chosen) == 1:
+            nearest = trees[0]
+        else:
+            nearest = [min(n, t) for (n, t) in zip(nearest, trees[-1])]
+    return chosen, trees
+
+
+def compile_landmarks(graph, k):
+    (chosen, distance_trees) = choose_landmarks(graph, k)
+    columns = {}
+    for metric in METRICS:
+        if metric == 'distance':
+            trees = distance_trees
+        else:
+            costs = edge_costs(graph, metric)
+            trees = [costs_from(graph, costs, landmark) for landmark in chosen]
+        # city-major, so the k bounds of a city are next to each other
+        columns[metric] = array.array("d", [float(tree[city]) for city in range(len(graph["names"])) for tree in trees])
+    header = { "version": FORMAT_VERSION, "sources": graph["sources"], "landmarks": chosen }
+    return header, columns
+
+
+def write_landmarks(path, header, columns):
+    graph_index.write_columns(path, MAGIC, header, columns)
+
+
+# Memory-map the landmarks of a graph, None if there is no file or it was built
+# for other source files
+def load(graph, path):
+    mapped = graph_index.map_columns(path, MAGIC)
+    if mapped is None:
+        return None
+    (header, columns) = mapped
+    if header["version"] != FORMAT_VERSION or header["sources"] != graph["sources"]:
+        return None
+    return dict(columns, landmarks=header["landmarks"], k=len(header["landmarks"]))
+
+
+# lower bound on the cost of a route between two cities
+def lower_bound(landmarks, metric, current_city, destination_city):
+    k = landmarks["k"]
+    column = landmarks[metric]
+    bound = 0
+    for i in range(k):
+        (a, b) = (column[current_city * k + i], column[destination_city * k + i])
+        if a >= 0 and b >= 0 and abs(a - b) > bound:
+            bound = abs(a - b)
+    if metric in EXACT_METRICS:
+        return bound
+    return max(bound - SLACK, 0)
+
+
+def landmark_path(segments_path="road-segments.txt"):
+    return os.path.join(os.path.dirname(os.path.abspath(segments_path)), LANDMARK_FILE)
+
+
+if __name__ == "__main__":
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LANDMARKS
+    graph = graph_index.load("road-segments.txt", "city-gps.txt")
+    (header, columns) = compile_landmarks(graph, k)
+    write_landmarks(landmark_path(), header, columns)
+    print("Wrote %d landmarks to %s" % (len(header["landmarks"]), landmark_path()))
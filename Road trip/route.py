@@ -15,6 +15,10 @@
 # The city-gps.txt file too is parsed into a dictionary. The key name would be the city name and the
 # value would be the longitude and latitudes. This data is used for calculating the eucledian distances
 #
+# Both files are now compiled once into a binary graph index (see graph_index.py): cities are integer ids,
+# the roads of a city are a contiguous range of edges, and every edge already has its length, hours and gas
+# as numbers. The index is memory-mapped on startup and rebuilt whenever one of the text files changes.
+#
 # State space: All the mappings present in the file, road segment
 # Edge weights:
 # If cost function is segments, then the edge weight is 1
@@ -36,41 +40,55 @@
 # MPG: By calculating the max gas consumed during the parsing of road-segments.txt and dividing it with the current eucledian
 # distance to the destination city, we get the admissible heuristic of mpg.
 #
+# LANDMARKS: ./landmarks.py precomputes the exact cost of every city from k landmark cities per cost function.
+# By the triangle inequality |cost(L, destination) - cost(L, city)| is a lower bound for every landmark L, and the
+# largest of them replaces the heuristics above when the landmark file is present (--no-landmarks turns it off).
+#
+# CONTRACTION HIERARCHIES: with --engine=ch the query runs on the precomputed hierarchies of contraction.py
+# instead, two small searches that only climb to more important cities, and returns the same optimal totals
+# for a single cost function (pareto is not supported).
+# The shortcuts are unpacked into the roads they stand for, and --highways prints the highway of each of them.
+#
+# PARETO: with the variant pareto the cheapest route of each cost function is printed, from four searches in one
+# process. With --frontier one multi-objective search also finds every route that no other route beats on
+# segments, miles, hours and gas at once, and the four answers are read off it.
+#
+# MATRIX: ./route.py --matrix origins.txt destinations.txt variant writes the miles, hours and gas of the
+# cheapest route between every origin and destination, one search per origin spread over a process pool.
+#
+# STATISTICS: --stats writes the cities expanded and generated, the peak fringe size, the time spent loading,
+# in the heuristic and on the fringe, and the peak memory as one JSON line to stderr (see ../searchstats.py).
+# --profile=cprofile or --profile=sample lists the functions the search spends its time in.
+#
 # Assumptions and simplifications
 #
 # If a point in road segments is not in gps file, then the distance is considered as 0.
 #
-from queue import PriorityQueue
+import array
+import csv
+import multiprocessing
+import os
 import sys
 from math import pow
-from copy import deepcopy
 from math import sqrt
+from math import isnan
+import contraction
+import graph_index
+import landmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import searchstats
+
+# astar is solve() below, ch answers from the contraction hierarchies of contraction.py
+ENGINES = ("astar", "ch")
 
 
 # return a list of possible successor states
-def successors(road_segments, cities_traversed):
+def successors(graph, current_city):
     # Things to return
-    # new_miles, new_hours, new_gas_gallons, new_path
-    # road_segments[cityA] = [(cityB, road_length, speed_limit, name)]
-    current_city = cities_traversed[len(cities_traversed) - 1]
-    successors_list = []
-
-    for (next_city, road_length, speed_limit, name) in road_segments.get(current_city):
-        if next_city not in cities_traversed:
-            new_path = deepcopy(cities_traversed)
-            new_path.append(next_city)
-            successors_list.append((road_length, float(road_length) / float(speed_limit),
-                                    calculate_gas_consumption(float(road_length), speed_limit), new_path))
-    return successors_list
-
-
-# This heuristic gives us the least possible gas consumption from the successor to the destination city
-def calculate_gas_consumption(road_length, speed_limit):
-    return road_length / mpg(speed_limit)
-
-
-def mpg(speed_limit):
-    return pow(1 - float(speed_limit) / 150, 4) * float(speed_limit) * 8 / 3
+    # next_city, road_miles, road_hours, road_gas_gallons
+    # the roads of a city are the edges graph_index.edges(graph, city)
+    return [(graph["targets"][edge], int(graph["length"][edge]), graph["hours"][edge], graph["gas"][edge])
+            for edge in graph_index.edges(graph, current_city)]
 
 
 # check if we've reached the goal
@@ -80,84 +98,325 @@ def is_goal(start_city, current_city):
 
 # Calculates the eucledian distance from the current city(The one we got from the successor) to the destination city
 # This is an admissible heuristic since the heuristic never overestimates the distance between two cities
-def distance_to_destination(city_gps, current_city, destination_city):
-    if city_gps.get(current_city) is None:
+# Cities without GPS data have NaN coordinates in the graph and get a distance of 0
+def distance_to_destination(graph, current_city, destination_city):
+    (latitude1, longitude1) = (graph["latitude"][current_city], graph["longitude"][current_city])
+    (latitude2, longitude2) = (graph["latitude"][destination_city], graph["longitude"][destination_city])
+    if isnan(latitude1) or isnan(latitude2):
         return float(0)
-    (latitude1, longitude1) = city_gps.get(current_city)
-    (latitude2, longitude2) = city_gps[destination_city]
-    return sqrt(pow(float(latitude1) - float(latitude2), 2) + pow(float(longitude1) - float(longitude2), 2))
+    return sqrt(pow(latitude1 - latitude2, 2) + pow(longitude1 - longitude2, 2))
 
 
 # The max speed is calculated during the parsing of road-segments.txt. This heuristic never overestimates since the
 # max time to the destination city can never be lower than the current time since we're considering the max speed
-def time_heuristic(max_speed, city_gps, current_city, destination_city):
-    return distance_to_destination(city_gps, current_city, destination_city) / max_speed
-
-
-def gas_consumption_heuristic(max_mpg, city_gps, current_city, destination_city):
-    return distance_to_destination(city_gps, current_city, destination_city) / max_mpg
+def time_heuristic(max_speed, graph, current_city, destination_city):
+    return distance_to_destination(graph, current_city, destination_city) / max_speed
+
+
+def gas_consumption_heuristic(max_mpg, graph, current_city, destination_city):
+    return distance_to_destination(graph, current_city, destination_city) / max_mpg
+
+
+def segment_heuristic(max_segment_length, graph, current_city, destination_city):
+    return distance_to_destination(graph, current_city, destination_city) / max_segment_length
+
+
+# g(s) of a route for the cost function, from its number of segments, miles, hours and gallons
+def route_cost(variant, segments, miles, hours, gas_gallons):
+    if variant == 'segments':
+        return segments
+    elif variant == 'distance':
+        return miles
+    elif variant == 'time':
+        return hours
+    elif variant == 'mpg':
+        return gas_gallons
+
+
+# h(s) for the cost function. With landmarks loaded (see landmarks.py) the landmark bound is used instead of the
+# GPS heuristics: it is tighter by orders of magnitude and, unlike them, stays consistent next to cities that have
+# no GPS data, so the first route found to a city is the cheapest one
+def heuristic(graph, variant, current_city, destination_city):
+    if graph.get("landmarks") is not None:
+        return landmarks.lower_bound(graph["landmarks"], variant, current_city, destination_city)
+    if variant == 'segments':
+        return segment_heuristic(graph["max_segment_length"], graph, current_city, destination_city)
+    elif variant == 'distance':
+        return distance_to_destination(graph, current_city, destination_city)
+    elif variant == 'time':
+        return time_heuristic(graph["max_speed"], graph, current_city, destination_city)
+    elif variant == 'mpg':
+        return gas_consumption_heuristic(graph["max_mpg"], graph, current_city, destination_city)
+
+
+# walk the parent pointers back from a city to rebuild the path from the start
+def path_to(parent, city):
+    path = [city]
+    while parent[city] != -1:
+        city = parent[city]
+        path.append(city)
+    return path[::-1]
+
+
+# The search runs on the integer ids of the graph index. Each city keeps the best label (g(s), miles, hours,
+# gallons) found so far and the city it was reached from, so the fringe only holds the running totals and a city
+# is pushed again only when a better route to it is found. Labels compare like the fringe entries do, so routes of
+# equal cost are still settled by the fewest miles. The fringe is a heapq; entries for a city that has already
+# been expanded are stale and skipped when popped.
+# With a destination the search stops once it is expanded; without one (h(s) = 0) it runs until every reachable
+# city is settled, giving the one-to-all search tree of the start city. With guided=False h(s) is 0 even with a
+# destination, so the route found is the one the search tree of the start city has for it.
+# Returns the labels and parents of the cities, the label is None for a city that was never reached.
+# Expanded and generated cities are written to stats if given (see searchstats.py)
+def search(graph, start_city, destination_city, variant, stats=None, guided=True):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    estimate = searchstats.timed(stats, "heuristic", heuristic)
+    best_label = [None] * len(graph["names"])
+    parent = [-1] * len(graph["names"])
+    segments = [0] * len(graph["names"])
+    visited = set()
+    best_label[start_city] = (0, 0, 0, 0)
+    fringe = [(0, 0, 0, 0, start_city)]
+
+    while fringe:
+        (cost, total_miles, total_hours, total_gas_gallons, city) = pop(fringe)
+        if city in visited:
+            continue
+        visited.add(city)
+
+        if is_goal(destination_city, city):
+            break
+
+        for (next_city, new_miles, new_hours, new_gas_gallons) in successors(graph, city):
+            if next_city not in visited:
+                (miles, hours, gas_gallons) = (total_miles + new_miles, float(total_hours) + new_hours,
+                                               float(total_gas_gallons) + new_gas_gallons)
+                label = (route_cost(variant, segments[city] + 1, miles, hours, gas_gallons), miles, hours, gas_gallons)
+                if best_label[next_city] is None or label < best_label[next_city]:
+                    best_label[next_city] = label
+                    parent[next_city] = city
+                    segments[next_city] = segments[city] + 1
+                    h = estimate(graph, variant, next_city, destination_city) \
+                        if guided and destination_city is not None else 0
+                    push(fringe, (label[0] + h, miles, hours, gas_gallons, next_city))
+    if stats is not None:
+        stats["expanded"] = len(visited)
+        stats["generated"] = len(best_label) - best_label.count(None)
+        stats["peak_closed"] = len(visited)
+    return best_label, parent
+
+
+# total_miles, total_hours, total_gas_gallons, path to a city of a finished search
+def route_from(graph, best_label, parent, destination_city):
+    if best_label[destination_city] is None:
+        return int(0), float(0), float(0), []
+    (cost, total_miles, total_hours, total_gas_gallons) = best_label[destination_city]
+    return total_miles, total_hours, total_gas_gallons, [graph["names"][c] for c in path_to(parent, destination_city)]
+
+
+# Cities are given and returned by name
+def solve(graph, start_city, destination_city, variant, stats=None):
+    if is_goal(start_city, destination_city):
+        return '', '', '', []
+    if start_city not in graph["ids"] or destination_city not in graph["ids"]:
+        return int(0), float(0), float(0), []
+
+    (start_city, destination_city) = (graph["ids"][start_city], graph["ids"][destination_city])
+    (best_label, parent) = search(graph, start_city, destination_city, variant, stats)
+    return route_from(graph, best_label, parent, destination_city)
+
+
+# The graph of the text files next to route.py, with the landmark bounds when they were preprocessed for them
+def load_graph(use_landmarks=True):
+    graph = graph_index.load("road-segments.txt", "city-gps.txt")
+    if use_landmarks:
+        graph["landmarks"] = landmarks.load(graph, landmarks.landmark_path("road-segments.txt"))
+    return graph
+
+
+#------------Pareto--------------------------
+# All four cost functions in one search. A label is a route to a city with its (segments, miles, hours, gallons);
+# one label dominates another when it is no worse in all four. Every city keeps the labels that no other label of
+# it dominates, and a new label is dropped when one of them dominates it, or when a route already found to the
+# destination dominates the label plus its lower bounds. What reaches the destination is the Pareto frontier:
+# every route that is not beaten on all four at once. The cheapest route of each cost function is on it, so the
+# four answers of solve() are read off the frontier
+def dominates(label1, label2):
+    return label1[0] <= label2[0] and label1[1] <= label2[1] and label1[2] <= label2[2] and label1[3] <= label2[3]
+
+
+# lower bounds of (segments, miles, hours, gallons) from a city to the destination
+def heuristic_vector(graph, current_city, destination_city):
+    return tuple(heuristic(graph, variant, current_city, destination_city)
+                 for variant in ('segments', 'distance', 'time', 'mpg'))
+
+
+# the Pareto frontier between two city ids, as labels and the cities of their routes. Labels expanded and generated
+# (every one stays in memory) and routes on the frontier are written to stats if given
+def pareto_search(graph, start_city, destination_city, stats=None):
+    (push, pop) = (searchstats.frontier_push(stats), searchstats.frontier_pop(stats))
+    bound_vector = searchstats.timed(stats, "heuristic", heuristic_vector)
+    # label i is labels[i] at cities[i], reached from label parents[i]
+    (labels, cities, parents, alive) = ([(0, 0, 0, 0)], [start_city], [-1], [True])
+    city_labels = { start_city: [0] }
+    bounds = {}
+    frontier = []
+    fringe = [((0, 0, 0, 0), 0)]
+    expanded = 0
+
+    while fringe:
+        (estimate, i) = pop(fringe)
+        if not alive[i] or any(dominates(labels[j], estimate) for j in frontier):
+            continue
+        if is_goal(destination_city, cities[i]):
+            frontier.append(i)
+            continue
+
+        expanded += 1
+        (segments, total_miles, total_hours, total_gas_gallons) = labels[i]
+        for (next_city, new_miles, new_hours, new_gas_gallons) in successors(graph, cities[i]):
+            label = (segments + 1, total_miles + new_miles, float(total_hours) + new_hours,
+                     float(total_gas_gallons) + new_gas_gallons)
+            others = city_labels.get(next_city, [])
+            if any(dominates(labels[j], label) for j in others):
+                continue
+            if next_city not in bounds:
+                bounds[next_city] = bound_vector(graph, next_city, destination_city)
+            estimate = tuple(g + h for (g, h) in zip(label, bounds[next_city]))
+            if any(dominates(labels[j], estimate) for j in frontier):
+                continue
+            for j in others:
+                if dominates(label, labels[j]):
+                    alive[j] = False
+            city_labels[next_city] = [j for j in others if alive[j]] + [len(labels)]
+            labels.append(label)
+            cities.append(next_city)
+            parents.append(i)
+            alive.append(True)
+            push(fringe, (estimate, len(labels) - 1))
+
+    if stats is not None:
+        stats["expanded"] = expanded
+        stats["generated"] = len(labels)
+        stats["peak_closed"] = len(labels)
+        stats["frontier_routes"] = len(frontier)
+
+    routes = []
+    for i in frontier:
+        if not any(dominates(labels[j], labels[i]) and labels[j] != labels[i] for j in frontier):
+            path = []
+            j = i
+            while j != -1:
+                path.append(cities[j])
+                j = parents[j]
+            routes.append((labels[i], path[::-1]))
+    return routes
+
+
+# Cities are given and returned by name. Returns the Pareto frontier as (segments, miles, hours, gallons, path)
+# with full_frontier, and the answer of solve() for each cost function. Without full_frontier the frontier is
+# empty and the answers are four calls of solve(), with their counts added up in stats if given: the frontier
+# search costs more than the four searches, so it is only run when the frontier is wanted
+def solve_pareto(graph, start_city, destination_city, stats=None, full_frontier=False):
+    variants = ('segments', 'distance', 'time', 'mpg')
+    if not full_frontier:
+        optima = {}
+        totals = { "expanded": 0, "generated": 0, "peak_closed": 0 }
+        for variant in variants:
+            optima[variant] = solve(graph, start_city, destination_city, variant, stats)
+            if stats is not None and "expanded" in stats:
+                totals = { "expanded": totals["expanded"] + stats["expanded"],
+                           "generated": totals["generated"] + stats["generated"],
+                           "peak_closed": max(totals["peak_closed"], stats["peak_closed"]) }
+        if stats is not None:
+            stats.update(totals)
+        return [], optima
 
+    if is_goal(start_city, destination_city):
+        return [], { variant: ('', '', '', []) for variant in variants }
+    if start_city not in graph["ids"] or destination_city not in graph["ids"]:
+        return [], { variant: (int(0), float(0), float(0), []) for variant in variants }
+
+    routes = pareto_search(graph, graph["ids"][start_city], graph["ids"][destination_city], stats)
+    frontier = sorted(label + ([graph["names"][c] for c in path],) for (label, path) in routes)
+    optima = {}
+    for variant in variants:
+        # ties are settled by the fewest miles, hours and gallons like solve()
+        best = min(frontier, key=lambda route: (route_cost(variant, *route[:4]),) + route[1:4], default=None)
+        optima[variant] = best[1:] if best is not None else (int(0), float(0), float(0), [])
+    return frontier, optima
+#------------Pareto Ended--------------------------
+
+
+#------------Matrix--------------------------
+# Cost matrices between many cities. Every origin needs one search without a destination, which settles all
+# cities at once, instead of one A* per pair. Origins are spread over a process pool; each worker maps the same
+# read-only graph index, so the pages of the graph are shared instead of copied
+MATRIX_MAGIC = b"RMTX"
+worker_graph = None
+
+
+def init_matrix_worker():
+    global worker_graph
+    worker_graph = load_graph(False)
+
+
+# miles, hours and gallons of the cheapest routes from one origin, NaN where there is no route
+def matrix_row(args):
+    (origin, destinations, variant) = args
+    (best_label, parent) = search(worker_graph, origin, None, variant)
+    nan = float("nan")
+    return [(best_label[d][1], best_label[d][2], best_label[d][3]) if best_label[d] is not None else (nan, nan, nan)
+            for d in destinations]
+
+
+def cost_matrix(graph, origins, destinations, variant, workers):
+    for city in origins + destinations:
+        if city not in graph["ids"]:
+            raise Exception("Error: unknown city " + city)
+    jobs = [(graph["ids"][origin], [graph["ids"][d] for d in destinations], variant) for origin in origins]
+    with multiprocessing.Pool(workers, initializer=init_matrix_worker) as pool:
+        return pool.map(matrix_row, jobs, chunksize=max(1, len(jobs) // (4 * workers)))
+
+
+def read_cities(path):
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+# CSV, one line per origin and destination, Inf where there is no route like the single route output.
+# City names hold commas, so they are quoted
+def write_matrix_csv(output, origins, destinations, rows):
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(["origin", "destination", "miles", "hours", "gas"])
+    for (origin, row) in zip(origins, rows):
+        for (destination, (miles, hours, gas_gallons)) in zip(destinations, row):
+            if miles != miles:
+                writer.writerow([origin, destination, "Inf", "Inf", "Inf"])
+            else:
+                writer.writerow([origin, destination, int(miles), repr(hours), repr(gas_gallons)])
 
-def segment_heuristic(max_segment_length, city_gps, current_city, destination_city):
-    return distance_to_destination(city_gps, current_city, destination_city) / max_segment_length
 
+# binary, with the layout of the graph index: the cities in the header and a miles, hours and gas column of
+# doubles, one row of destinations per origin
+def write_matrix_binary(path, origins, destinations, variant, rows):
+    columns = { name: array.array("d", [cell[i] for row in rows for cell in row])
+                for (i, name) in enumerate(("miles", "hours", "gas")) }
+    graph_index.write_columns(path, MATRIX_MAGIC, { "variant": variant, "origins": origins,
+                                                    "destinations": destinations }, columns)
+#------------Matrix Ended--------------------------
 
-def solve(city_gps, road_segments, start_city, destination_city, variant, max_speed, max_mpg, max_segment_length):
-    if is_goal(start_city, destination_city):
-        return '', '', '', []
 
-    visited = []
-    # This is a list of all the cities in the path. This list is maintained for each mapping in the fringe for
-    # knowing the cities traversed
-    path = [start_city]
-    fringe = PriorityQueue()
-    fringe.put((0, 0, 0, 0, path))
-
-    while not fringe.empty():
-        (cost, total_miles, total_hours, total_gas_gallons, path) = fringe.get()
-        visited.append(path[len(path) - 1])
-
-        if is_goal(destination_city, path[len(path) - 1]):
-            return total_miles, total_hours, total_gas_gallons, path
-
-        for (new_miles, new_hours, new_gas_gallons, new_path) in successors(road_segments, path):
-            if new_path[len(new_path) - 1] not in visited:
-                if variant == 'segments':
-                    fringe.put((len(new_path) + segment_heuristic(max_segment_length, city_gps, new_path[len(new_path) - 1], destination_city),
-                                int(total_miles) + int(new_miles), float(total_hours) + float(new_hours),
-                                float(total_gas_gallons) + float(new_gas_gallons), new_path))
-                elif variant == 'distance':
-                    # Distance is found from road_segments and the heuristic is calculated b/n the second city and final city. It should be short
-                    fringe.put((int(total_miles) + int(new_miles) + distance_to_destination(city_gps, new_path[len(new_path) - 1], destination_city),
-                                int(total_miles) + int(new_miles),
-                                float(total_hours) + float(new_hours),
-                                float(total_gas_gallons) + float(new_gas_gallons), new_path))
-                elif variant == 'time':
-                    # Time is found by dividing the distance by velocity.
-                    fringe.put((float(total_hours) + float(new_hours) +
-                                time_heuristic(max_speed, city_gps, new_path[len(new_path) - 1], destination_city),
-                                int(total_miles) + int(new_miles),
-                                float(total_hours) + float(new_hours),
-                                float(total_gas_gallons) + float(new_gas_gallons), new_path))
-                elif variant == 'mpg':
-                    # MPG(v)=(8*v(1 − v/150)^4)/3
-                    fringe.put((float(total_gas_gallons) + float(new_gas_gallons) +
-                                gas_consumption_heuristic(max_mpg, city_gps, new_path[len(new_path) - 1], destination_city),
-                                int(total_miles) + int(new_miles),
-                                float(total_hours) + float(new_hours),
-                                float(total_gas_gallons) + float(new_gas_gallons), new_path))
-    return int(0), float(0), float(0), []
-
-
-# Mapping of a->b in Road-Segments.txt is stored in the dictionary as
-# a->b and b->a
-# This way, getting the successors of a city can be retrieved in almost O(1) time
-def add_city_entry(road_segments, cityA, cityB, road_length, speed_limit, name):
-    road_mapping = road_segments.get(cityA)
-    if road_mapping is None:
-        road_segments[cityA] = [(cityB, road_length, speed_limit, name)]
-    else:
-        road_mapping.append((cityB, road_length, speed_limit, name))
+# the output line of a result of solve()
+def format_result(result):
+    if result == ('', '', '', []):
+        # when start and destination city are same
+        return "Inf"
+    # total_miles, total_hours, total_gas_gallons, path
+    if (len(result[3]) - 1) < 1:
+        return "Inf"
+    return str((len(result[3]) - 1)) + " " + str(result[0]) + " " + str(result[1]) + " " + str(result[2]) + \
+           " " + " ".join(result[3])
 
 
 def is_valid_input_cities(start_city, destination_city, road_segments):
@@ -169,66 +428,102 @@ def is_valid_input_cities(start_city, destination_city, road_segments):
         list(filter(None, destination_city.split(',_')))) == 2
 
 
+# ./route.py --matrix origins.txt destinations.txt variant [--workers=N] [--binary=PATH]
+# The files list one city per line; the matrices go to stdout as CSV, or to PATH in binary
+def matrix_main(arguments):
+    if len(arguments) < 3 or arguments[2] not in landmarks.METRICS:
+        raise Exception("Error: expected origins, destinations and a cost function")
+    (origins, destinations, variant) = (read_cities(arguments[0]), read_cities(arguments[1]), arguments[2])
+    workers = os.cpu_count()
+    binary = None
+    for option in arguments[3:]:
+        (key, value) = option.split("=", 1) if "=" in option else (option, "")
+        if key == "--workers":
+            workers = int(value)
+        elif key == "--binary":
+            binary = value
+        else:
+            raise Exception("Error: unsupported option " + option)
+    rows = cost_matrix(load_graph(False), origins, destinations, variant, workers)
+    if binary is None:
+        write_matrix_csv(sys.stdout, origins, destinations, rows)
+    else:
+        write_matrix_binary(binary, origins, destinations, variant, rows)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
+    if len(sys.argv) > 1 and sys.argv[1] == "--matrix":
+        matrix_main(sys.argv[2:])
+        sys.exit(0)
+
+    if len(sys.argv) < 4:
         raise Exception("Error: expected 3 arguments")
 
     start_city = sys.argv[1]
     destination_city = sys.argv[2]
     variant = sys.argv[3]
-
-    # city_locations is a list of list containing the city name, the longitude and latitude. If the longitude or
-    # latitude isn't mentioned for a city, it isn't stored in the HashMap. That would mean, the distance from that
-    # city to the final destination while calculating the Heuristic would be infinite. So ideally PriorityQueue would
-    # never return this as a route
-
-    # There might be a problem with this assumption. If there's a really short path through this city, we would never
-    # consider this path until all the other routes are considered
-    city_gps = {}
-    with open("city-gps.txt", 'r') as file:
-        for line in file:
-            elements = line.split()
-            if len(elements) == 3:
-                city_gps[elements[0]] = (elements[1], elements[2])
-
-    # road_segments is a list of lists containing the two locations of
-    # These max speeds, mpg and lengths are calculated for later use in the heuristics
-    road_segments = {}
-    max_speed = float(0)
-    max_mpg = float(0)
-    max_segment_length = float(0)
-    with open("road-segments.txt", 'r') as file:
-        for line in file:
-            elements = line.split()
-            # first city, second city, length (in miles), speed limit (in miles per hour), name of highway
-            if len(elements) == 5:
-                add_city_entry(road_segments, elements[0], elements[1], elements[2], elements[3], elements[4])
-                add_city_entry(road_segments, elements[1], elements[0], elements[2], elements[3], elements[4])
-
-                if max_speed < float(elements[3]):
-                    max_speed = float(elements[3])
-
-                current_mpg = mpg(float(elements[3]))
-                if max_mpg < current_mpg:
-                    max_mpg = current_mpg
-
-                if max_segment_length < float(elements[2]):
-                    max_segment_length = float(elements[2])
-
-    if is_valid_input_cities(start_city, destination_city, road_segments):
+    use_landmarks = True
+    engine = "astar"
+    show_frontier = False
+    show_highways = False
+    # --stats writes search statistics as JSON to stderr, --profile=(cprofile|sample) profiles the search
+    (stats, profiler, options) = searchstats.parse_options(sys.argv[4:])
+    for option in options:
+        if option == "--no-landmarks":
+            use_landmarks = False
+        elif option == "--frontier":
+            show_frontier = True
+        elif option == "--highways":
+            show_highways = True
+        elif option.startswith("--engine=") and option[len("--engine="):] in ENGINES:
+            engine = option[len("--engine="):]
+        else:
+            raise Exception("Error: unsupported option " + option)
+    if show_highways and engine != "ch":
+        raise Exception("Error: --highways needs --engine=ch")
+    if engine == "ch" and variant == "pareto":
+        raise Exception("Error: --engine=ch does not support the pareto variant")
+
+    # The road segments and GPS locations are read from the compiled graph index, which is rebuilt from the text
+    # files when they change. The max speeds, mpg and lengths for the heuristics are computed while indexing.
+    # Landmark bounds are used when ./landmarks.py has been run for the current files
+    with searchstats.phase(stats, "parse"):
+        graph = load_graph(use_landmarks)
+
+    if is_valid_input_cities(start_city, destination_city, graph["names"]) and variant == "pareto":
+        # the answer of every cost function from one search, then the whole frontier with --frontier
         print("Solving...")
-        result = solve(city_gps, road_segments, start_city, destination_city, variant, max_speed, max_mpg, max_segment_length)
-
-        if result == ('', '', '', []):
-            # when start and destination city are same
-            print("Inf")
+        with searchstats.phase(stats, "search"):
+            (frontier, optima) = searchstats.profiled(profiler, solve_pareto, graph, start_city, destination_city, stats,
+                                                      show_frontier)
+        for cost_function in ('segments', 'distance', 'time', 'mpg'):
+            print(cost_function + " " + format_result(optima[cost_function]))
+        if show_frontier:
+            for route in frontier:
+                print(format_result(route[1:]))
+    elif is_valid_input_cities(start_city, destination_city, graph["names"]) and variant not in landmarks.METRICS:
+        # an unknown cost function finds no route, checked here so no search or hierarchy has to know about it
+        print("Solving...")
+        print("Inf")
+    elif is_valid_input_cities(start_city, destination_city, graph["names"]):
+        print("Solving...")
+        if engine == "ch":
+            # built and saved by contraction.py on first use
+            with searchstats.phase(stats, "parse"):
+                hierarchies = contraction.load_or_build(graph, contraction.contraction_path("road-segments.txt"))
+            with searchstats.phase(stats, "search"):
+                (result, highways) = searchstats.profiled(profiler, contraction.solve, graph, hierarchies,
+                                                          start_city, destination_city, variant, stats)
         else:
-            # total_miles, total_hours, total_gas_gallons, path
-            if (len(result[3]) - 1) < 1:
-                print("Inf")
-            else:
-                print(str((len(result[3]) - 1)) + " " + str(result[0]) + " " + str(result[1]) + " " + str(result[2]) +
-                  " " + " ".join(result[3]))
+            with searchstats.phase(stats, "search"):
+                result = searchstats.profiled(profiler, solve, graph, start_city, destination_city, variant, stats)
+
+        print(format_result(result))
+        if show_highways and format_result(result) != "Inf":
+            # the highway of every segment of the route, in order
+            print(" ".join(highways))
     else:
         # either of start or destination city not present in roadsegmets
         print("Inf")
+    if stats is not None:
+        searchstats.report(stats)
@@ -0,0 +1,187 @@
+#!/usr/local/bin/python3
+# route_server.py : Resident route query server for route.py
+#
+# Loads the graph index once and answers route queries as JSON lines, either
+# on stdin/stdout or on a Unix socket where every connection is served by its
+# own thread. A query is
+#   {"start": "Bloomington,_Indiana", "destination": "Indianapolis,_Indiana", "variant": "time"}
+# and is answered with
+#   {"status": "ok", "segments": 4, "miles": 52, "hours": 1.05, "gas": 2.03, "route": [...], "source": "search"}
+# or {"status": "Inf"} when route.py would print Inf. {"command": "stats"}
+# returns the counters.
+#
+# Answers are kept in a bounded LRU cache keyed on (start, destination,
+# variant). When a start city is queried again for the same variant, the
+# one-to-all search tree of that city is computed and kept in a second, smaller
+# LRU cache, so every later query from it is a walk up the tree. A tree is a
+# search without heuristic, and a query that is not in a tree runs that same
+# search stopped at the destination, so an answer does not depend on which
+# queries came before it. Without a heuristic the routes are the cheapest ones
+# even where route.solve settles a city too early (cities without GPS data
+# get h(s) = 0, which makes the heuristic inconsistent next to them).
+# A query that is not a JSON object is answered with {"status": "error"}.
+#
+# Usage: ./route_server.py [--socket=PATH] [--cache-size=4096] [--trees=16]
+#
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+import route
+
+VARIANTS = ("segments", "distance", "time", "mpg")
+
+
+# A dict that forgets the least recently used entry beyond its size
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class RouteService:
+    def __init__(self, graph, cache_size, trees):
+        self.graph = graph
+        self.results = LRUCache(cache_size)
+        self.trees = LRUCache(trees)
+        # start cities queried once per variant, the second query builds the tree
+        self.sources = LRUCache(cache_size)
+        self.lock = threading.Lock()
+        self.counters = { "queries": 0, "result_hits": 0, "tree_hits": 0, "searches": 0, "trees_built": 0,
+                          "seconds": 0.0, "max_seconds": 0.0 }
+
+    def answer(self, query):
+        if not isinstance(query, dict):
+            return { "status": "error", "message": "expected a JSON object" }
+        if query.get("command") == "stats":
+            return self.stats()
+        start_time = time.perf_counter()
+        (start_city, destination_city, variant) = (query.get("start"), query.get("destination"), query.get("variant"))
+        if variant not in VARIANTS or not isinstance(start_city, str) or not isinstance(destination_city, str):
+            return { "status": "error", "message": "expected start, destination and variant" }
+
+        key = (start_city, destination_city, variant)
+        with self.lock:
+            result = self.results.get(key)
+            tree = self.trees.get((start_city, variant))
+            repeated = self.sources.get((start_city, variant)) is not None
+            self.sources.put((start_city, variant), True)
+        if result is not None:
+            source = "cache"
+        elif not route.is_valid_input_cities(start_city, destination_city, self.graph["names"]):
+            # route.py prints Inf without solving
+            (result, source) = (('', '', '', []), "search")
+        elif route.is_goal(start_city, destination_city) or \
+                start_city not in self.graph["ids"] or destination_city not in self.graph["ids"]:
+            (result, source) = (route.solve(self.graph, start_city, destination_city, variant), "search")
+        elif tree is not None or repeated:
+            if tree is None:
+                tree = route.search(self.graph, self.graph["ids"][start_city], None, variant)
+                with self.lock:
+                    self.trees.put((start_city, variant), tree)
+                    self.counters["trees_built"] += 1
+            result = route.route_from(self.graph, tree[0], tree[1], self.graph["ids"][destination_city])
+            source = "tree"
+        else:
+            destination = self.graph["ids"][destination_city]
+            (best_label, parent) = route.search(self.graph, self.graph["ids"][start_city], destination, variant,
+                                                guided=False)
+            (result, source) = (route.route_from(self.graph, best_label, parent, destination), "search")
+
+        seconds = time.perf_counter() - start_time
+        with self.lock:
+            self.results.put(key, result)
+            self.counters["queries"] += 1
+            self.counters[{ "cache": "result_hits", "tree": "tree_hits", "search": "searches" }[source]] += 1
+            self.counters["seconds"] += seconds
+            self.counters["max_seconds"] = max(self.counters["max_seconds"], seconds)
+
+        # total_miles, total_hours, total_gas_gallons, path
+        if result == ('', '', '', []) or len(result[3]) - 1 < 1:
+            return { "status": "Inf", "source": source }
+        return { "status": "ok", "segments": len(result[3]) - 1, "miles": result[0], "hours": result[1],
+                 "gas": result[2], "route": result[3], "source": source }
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            (cached, trees) = (len(self.results.entries), len(self.trees.entries))
+        queries = counters["queries"]
+        return dict(counters, status="ok", cached_results=cached, cached_trees=trees,
+                    hit_rate=(counters["result_hits"] + counters["tree_hits"]) / queries if queries else 0.0,
+                    mean_seconds=counters["seconds"] / queries if queries else 0.0)
+
+    # answer every JSON line of a text stream
+    def serve(self, lines, output):
+        for line in lines:
+            if line.strip():
+                try:
+                    response = self.answer(json.loads(line))
+                except ValueError:
+                    response = { "status": "error", "message": "invalid JSON" }
+                output.write(json.dumps(response) + "\n")
+                output.flush()
+
+
+class ConnectionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lines = (line.decode() for line in self.rfile)
+        self.server.service.serve(lines, TextWriter(self.wfile))
+
+
+# text writes on a binary socket file
+class TextWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, text):
+        self.file.write(text.encode())
+
+    def flush(self):
+        self.file.flush()
+
+
+class RouteServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    options = { "socket": None, "cache-size": "4096", "trees": "16" }
+    for option in sys.argv[1:]:
+        (key, value) = option[2:].split("=", 1) if "=" in option else (option[2:], "")
+        if option.startswith("--") and key in options:
+            options[key] = value
+        else:
+            raise(Exception("Error: unsupported option " + option))
+
+    service = RouteService(route.load_graph(),
+                           int(options["cache-size"]), int(options["trees"]))
+    if options["socket"] is None:
+        service.serve(sys.stdin, sys.stdout)
+    else:
+        if os.path.exists(options["socket"]):
+            os.remove(options["socket"])
+        server = RouteServer(options["socket"], ConnectionHandler)
+        server.service = service
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(options["socket"])
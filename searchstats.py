@@ -0,0 +1,165 @@
+#!/usr/local/bin/python3
+#
+# searchstats.py : Search statistics and profiling shared by the three solvers
+#
+# A solver takes an optional stats dict. Counters that fall out of its own
+# data structures (states expanded and generated, closed set size) are written
+# at the end of the search whenever a dict is given. Timers and frontier
+# tracking are only attached to a dict made by new(): the solver asks for its
+# queue and heuristic functions through timed(), frontier_push() and
+# frontier_pop(), which hand back the plain functions when stats are off, so
+# the inner loop of a search without stats calls what it did before and pays
+# nothing for the instrumentation.
+#
+# report() writes the stats as one JSON line with the peak RSS of the process.
+# profiled() runs a solver under cProfile, or under a sampling profiler that
+# counts the function running every millisecond of CPU time, and writes the
+# busiest functions to stderr.
+#
+# The solvers live in sibling directories and import this file with
+#   sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+#
+import contextlib
+import cProfile
+import heapq
+import io
+import json
+import os
+import pstats
+import resource
+import signal
+import sys
+import time
+from collections import Counter
+
+PROFILERS = ("cprofile", "sample")
+
+# functions listed by the profilers
+PROFILE_LINES = 25
+
+def new():
+    return { "generated": 0, "expanded": 0, "pushed": 0, "popped": 0, "peak_frontier": 0, "peak_closed": 0,
+             "seconds": {} }
+
+# whether timers and frontier tracking are on for a stats dict
+def enabled(stats):
+    return stats is not None and "seconds" in stats
+
+def add_time(stats, key, seconds):
+    stats["seconds"][key] = stats["seconds"].get(key, 0.0) + seconds
+
+# keep the largest value seen for a counter
+def peak(stats, key, value):
+    if stats is not None and value > stats.get(key, 0):
+        stats[key] = value
+
+# function, with the time spent in it added to stats["seconds"][key]
+def timed(stats, key, function):
+    if not enabled(stats):
+        return function
+    def timed_function(*args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            add_time(stats, key, time.perf_counter() - start)
+    return timed_function
+
+# heap push that counts pushes, times them as queue and records the peak frontier size
+def frontier_push(stats, push=heapq.heappush):
+    if not enabled(stats):
+        return push
+    timed_push = timed(stats, "queue", push)
+    def tracked_push(frontier, item):
+        timed_push(frontier, item)
+        stats["pushed"] += 1
+        if len(frontier) > stats["peak_frontier"]:
+            stats["peak_frontier"] = len(frontier)
+    return tracked_push
+
+# heap pop that counts pops and times them as queue
+def frontier_pop(stats, pop=heapq.heappop):
+    if not enabled(stats):
+        return pop
+    timed_pop = timed(stats, "queue", pop)
+    def tracked_pop(frontier):
+        stats["popped"] += 1
+        return timed_pop(frontier)
+    return tracked_pop
+
+# time a block, like parsing the input, as stats["seconds"][key]
+@contextlib.contextmanager
+def phase(stats, key):
+    if not enabled(stats):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(stats, key, time.perf_counter() - start)
+
+# peak resident set size of this process in KiB (getrusage gives bytes on macOS)
+def peak_rss_kib():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def report(stats, file=None):
+    print(json.dumps(dict(stats, peak_rss_kib=peak_rss_kib())), file=file or sys.stderr, flush=True)
+
+#------------Profiling--------------------------
+# Run function(*args) under a profiler (None runs it as it is) and write the
+# busiest functions to stderr
+def profiled(profiler, function, *args):
+    if profiler is None:
+        return function(*args)
+    elif profiler == "cprofile":
+        return cprofiled(function, *args)
+    elif profiler == "sample":
+        return sampled(function, *args)
+    raise(Exception("Error: unsupported profiler " + profiler))
+
+def cprofiled(function, *args):
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args)
+    finally:
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        print(output.getvalue(), file=sys.stderr, flush=True)
+
+# Sampling profiler: a SIGPROF timer interrupts every interval seconds of CPU
+# time and the function running at that moment is counted. Much cheaper than
+# cProfile on searches with millions of small calls, at the price of precision
+def sampled(function, *args, interval=0.001):
+    samples = Counter()
+    def on_sample(signum, frame):
+        samples["%s:%s" % (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)] += 1
+    previous = signal.signal(signal.SIGPROF, on_sample)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        return function(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+        total = sum(samples.values())
+        print(json.dumps({ "samples": total, "interval": interval,
+                           "functions": [ [name, count] for (name, count) in samples.most_common(PROFILE_LINES) ] }),
+              file=sys.stderr, flush=True)
+#------------Profiling Ended--------------------------
+
+# Take the shared --stats and --profile=(cprofile|sample) options out of a
+# command line. Returns (stats, profiler, remaining arguments); stats is None
+# unless --stats was given
+def parse_options(arguments):
+    (stats, profiler, remaining) = (None, None, [])
+    for argument in arguments:
+        if argument == "--stats":
+            stats = new()
+        elif argument.startswith("--profile="):
+            profiler = argument[len("--profile="):]
+            if profiler not in PROFILERS:
+                raise(Exception("Error: unsupported profiler " + profiler))
+        else:
+            remaining.append(argument)
+    return stats, profiler, remaining